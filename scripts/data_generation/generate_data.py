@@ -1,15 +1,28 @@
 import pandas as pd
+import numpy as np
 import random
 import json
 import yaml
+import argparse
+import multiprocessing
+from collections import deque
+import pyarrow as pa
+import pyarrow.parquet as pq
 from faker import Faker
 from datetime import datetime, date
 import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import schema_registry  # noqa: E402
+
+
+SEED = 42
 
 fake = Faker()
-random.seed(42)
-Faker.seed(42)
+random.seed(SEED)
+Faker.seed(SEED)
+rng = np.random.default_rng(SEED)
 
 # Ensure output directories exist
 os.makedirs("data/raw", exist_ok=True)
@@ -23,12 +36,160 @@ cfg = config["data_generation"]
 
 START_DATE = datetime.strptime(cfg["start_date"], "%Y-%m-%d").date()
 END_DATE = datetime.strptime(cfg["end_date"], "%Y-%m-%d").date()
+END_DATETIME = datetime.combine(END_DATE, datetime.min.time())
+
+DISCOUNT_OPTIONS = np.array([0, 5, 10, 15])
+AGE_GROUPS = ["18-25", "26-35", "36-45", "46+"]
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "UPI", "Cash on Delivery", "Net Banking"]
+
+STREAMING = cfg.get("streaming", False)
+# Rows per seeded shard. Shards are the unit of work for --workers and the
+# most a streaming run holds in memory; the output depends on this size but
+# not on the number of workers.
+SHARD_SIZE = cfg.get("shard_size", 1000)
+
+POOL_CFG = cfg.get("value_pools", {})
+USE_VALUE_POOLS = POOL_CFG.get("enabled", False)
+VALUE_POOL_SIZE = POOL_CFG.get("size", 1000)
+
+RAW_FORMAT = cfg.get("raw_format", "csv")
+PARQUET_COMPRESSION = cfg.get("parquet_compression", "snappy")
+PARQUET_ROW_GROUPS_BY_DATE = cfg.get("parquet_row_groups_by_date", False)
+
+# Columns used to split Parquet row groups by month
+DATE_COLUMNS = {
+    "customers": "registration_date",
+    "transactions": "transaction_date"
+}
+
+value_pools = None
+parquet_writers = {}
+
+
+# Shard seeds are derived from (SEED, entity, shard index) so every shard
+# produces the same rows whichever process generates it.
+SHARD_ENTITIES = {"customers": 0, "products": 1, "transactions": 2}
+
+shard_products = None
+shard_customer_keys = None
+
+
+def format_ids(prefix: str, start: int, stop: int, width: int) -> pd.Series:
+    return prefix + pd.Series(np.arange(start, stop)).astype(str).str.zfill(width)
+
+
+def get_value_pools() -> dict:
+    # Built once per process from a dedicated Faker seeded with SEED, so the
+    # pools are identical in every shard worker.
+    global value_pools
+    if value_pools is None:
+        pool_fake = Faker()
+        pool_fake.seed_instance(SEED)
+        value_pools = {
+            "first_name": [pool_fake.first_name() for _ in range(VALUE_POOL_SIZE)],
+            "last_name": [pool_fake.last_name() for _ in range(VALUE_POOL_SIZE)],
+            "phone": [pool_fake.phone_number() for _ in range(VALUE_POOL_SIZE)],
+            "city": [pool_fake.city() for _ in range(VALUE_POOL_SIZE)],
+            "state": [pool_fake.state() for _ in range(VALUE_POOL_SIZE)],
+            "address": [
+                pool_fake.address().replace("\n", ", ") for _ in range(VALUE_POOL_SIZE)
+            ]
+        }
+        value_pools = {key: np.array(values, dtype=object) for key, values in value_pools.items()}
+    return value_pools
+
+
+def sample_pool(name: str, size: int) -> np.ndarray:
+    pool = get_value_pools()[name]
+    return pool[rng.integers(0, len(pool), size=size)]
+
+
+def sample_dates(size: int) -> pd.Series:
+    num_days = (END_DATE - START_DATE).days
+    offsets = rng.integers(0, num_days + 1, size=size)
+    return pd.Series(pd.Timestamp(START_DATE) + pd.to_timedelta(offsets, unit="D")).dt.date
+
+
+def sample_times(size: int) -> pd.Series:
+    seconds = pd.Series(rng.integers(0, 24 * 60 * 60, size=size))
+    return (
+        (seconds // 3600).astype(str).str.zfill(2) + ":"
+        + (seconds // 60 % 60).astype(str).str.zfill(2) + ":"
+        + (seconds % 60).astype(str).str.zfill(2)
+    )
+
+
+def seed_shard(entity: str, shard_index: int):
+    global rng
+    shard_seed = int(
+        np.random.SeedSequence([SEED, SHARD_ENTITIES[entity], shard_index]).generate_state(1)[0]
+    )
+    random.seed(shard_seed)
+    fake.seed_instance(shard_seed)
+    fake.unique.clear()
+    rng = np.random.default_rng(shard_seed)
+
+
+def shard_range(total: int, shard_size: int, shard_index: int) -> tuple:
+    start = shard_index * shard_size + 1
+    return start, min(shard_size, total - start + 1)
+
+
+def init_shard_worker(products_df=None):
+    global shard_products, shard_customer_keys
+    shard_products = products_df
+    shard_customer_keys = schema_registry.apply_schema(pd.DataFrame({
+        "customer_id": format_ids("CUST", 1, cfg["customers"] + 1, 4)
+    }), "customers")
+
+
+def generate_customer_shard(shard_index: int) -> pd.DataFrame:
+    seed_shard("customers", shard_index)
+    start, size = shard_range(cfg["customers"], SHARD_SIZE, shard_index)
+    return generate_customers(size, start_id=start)
+
+
+def generate_product_shard(shard_index: int) -> pd.DataFrame:
+    seed_shard("products", shard_index)
+    start, size = shard_range(cfg["products"], SHARD_SIZE, shard_index)
+    return generate_products(size, start_id=start)
+
 
+def generate_transaction_shard(shard_index: int) -> tuple:
+    seed_shard("transactions", shard_index)
+    start, size = shard_range(cfg["transactions"], SHARD_SIZE, shard_index)
+    transactions_df = generate_transactions(size, shard_customer_keys, start_id=start)
+    # Item IDs are renumbered globally when the shards are merged
+    items_df = generate_transaction_items(transactions_df, shard_products)
+    return transactions_df, items_df
+
+
+def run_shards(shard_func, num_shards: int, workers: int, initargs: tuple = ()):
+    # Yields shard results in shard order, keeping at most 2 * workers
+    # finished shards buffered in the parent.
+    if workers <= 1:
+        init_shard_worker(*initargs)
+        for shard_index in range(num_shards):
+            yield shard_func(shard_index)
+        return
+
+    with multiprocessing.Pool(workers, initializer=init_shard_worker, initargs=initargs) as pool:
+        pending = deque()
+        for shard_index in range(num_shards):
+            pending.append(pool.apply_async(shard_func, (shard_index,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def generate_customers(num_customers: int, start_id: int = 1) -> pd.DataFrame:
+    if USE_VALUE_POOLS:
+        return generate_customers_from_pools(num_customers, start_id)
 
-def generate_customers(num_customers: int) -> pd.DataFrame:
     customers = []
 
-    for i in range(1, num_customers + 1):
+    for i in range(start_id, start_id + num_customers):
         customers.append({
             "customer_id": f"CUST{i:04d}",
             "first_name": fake.first_name(),
@@ -39,17 +200,39 @@ def generate_customers(num_customers: int) -> pd.DataFrame:
             "city": fake.city(),
             "state": fake.state(),
             "country": "India",
-            "age_group": random.choice(["18-25", "26-35", "36-45", "46+"])
+            "age_group": random.choice(AGE_GROUPS)
         })
 
     return pd.DataFrame(customers)
 
 
-def generate_products(num_products: int) -> pd.DataFrame:
+def generate_customers_from_pools(num_customers: int, start_id: int = 1) -> pd.DataFrame:
+    customer_ids = format_ids("CUST", start_id, start_id + num_customers, 4)
+    first_names = pd.Series(sample_pool("first_name", num_customers))
+    last_names = pd.Series(sample_pool("last_name", num_customers))
+
+    return pd.DataFrame({
+        "customer_id": customer_ids,
+        "first_name": first_names,
+        "last_name": last_names,
+        # Unique by construction: the customer ID is part of the address
+        "email": (
+            first_names + "." + last_names + "." + customer_ids + "@example.com"
+        ).str.lower(),
+        "phone": sample_pool("phone", num_customers),
+        "registration_date": sample_dates(num_customers),
+        "city": sample_pool("city", num_customers),
+        "state": sample_pool("state", num_customers),
+        "country": "India",
+        "age_group": rng.choice(AGE_GROUPS, size=num_customers)
+    })
+
+
+def generate_products(num_products: int, start_id: int = 1) -> pd.DataFrame:
     categories = ["Electronics", "Clothing", "Books", "Sports", "Beauty", "Home & Kitchen"]
     products = []
 
-    for i in range(1, num_products + 1):
+    for i in range(start_id, start_id + num_products):
         price = round(random.uniform(200, 50000), 2)
         cost = round(price * random.uniform(0.6, 0.9), 2)
 
@@ -68,18 +251,22 @@ def generate_products(num_products: int) -> pd.DataFrame:
     return pd.DataFrame(products)
 
 
-def generate_transactions(num_transactions: int, customers_df: pd.DataFrame) -> pd.DataFrame:
+def generate_transactions(num_transactions: int, customers_df: pd.DataFrame,
+                          start_id: int = 1) -> pd.DataFrame:
+    if USE_VALUE_POOLS:
+        return generate_transactions_from_pools(num_transactions, customers_df, start_id)
+
     transactions = []
+    customer_ids = customers_df["customer_id"].tolist()
 
-    for i in range(1, num_transactions + 1):
+    for i in range(start_id, start_id + num_transactions):
         transactions.append({
             "transaction_id": f"TXN{i:05d}",
-            "customer_id": random.choice(customers_df["customer_id"].tolist()),
+            "customer_id": random.choice(customer_ids),
             "transaction_date": fake.date_between(START_DATE, END_DATE),
-            "transaction_time": fake.time(),
-            "payment_method": random.choice([
-                "Credit Card", "Debit Card", "UPI", "Cash on Delivery", "Net Banking"
-            ]),
+            # Bounded explicitly: fake.time() defaults to the wall clock
+            "transaction_time": fake.time(end_datetime=END_DATETIME),
+            "payment_method": random.choice(PAYMENT_METHODS),
             "shipping_address": fake.address().replace("\n", ", "),
             "total_amount": 0.00  # calculated later
         })
@@ -87,45 +274,52 @@ def generate_transactions(num_transactions: int, customers_df: pd.DataFrame) ->
     return pd.DataFrame(transactions)
 
 
-def generate_transaction_items(transactions_df: pd.DataFrame,
-                               products_df: pd.DataFrame) -> pd.DataFrame:
-    items = []
-    item_counter = 1
-    transaction_totals = {}
-
-    for _, txn in transactions_df.iterrows():
-        txn_id = txn["transaction_id"]
-        num_items = random.randint(1, 5)
-        txn_total = 0.0
-
-        for _ in range(num_items):
-            product = products_df.sample(1).iloc[0]
-            quantity = random.randint(1, 4)
-            discount = random.choice([0, 5, 10, 15])
-
-            line_total = round(
-                quantity * product["price"] * (1 - discount / 100), 2
-            )
-
-            items.append({
-                "item_id": f"ITEM{item_counter:05d}",
-                "transaction_id": txn_id,
-                "product_id": product["product_id"],
-                "quantity": quantity,
-                "unit_price": product["price"],
-                "discount_percentage": discount,
-                "line_total": line_total
-            })
+def generate_transactions_from_pools(num_transactions: int, customers_df: pd.DataFrame,
+                                     start_id: int = 1) -> pd.DataFrame:
+    customer_ids = customers_df["customer_id"].to_numpy()
 
-            txn_total += line_total
-            item_counter += 1
+    return pd.DataFrame({
+        "transaction_id": format_ids("TXN", start_id, start_id + num_transactions, 5),
+        "customer_id": customer_ids[rng.integers(0, len(customer_ids), size=num_transactions)],
+        "transaction_date": sample_dates(num_transactions),
+        "transaction_time": sample_times(num_transactions),
+        "payment_method": rng.choice(PAYMENT_METHODS, size=num_transactions),
+        "shipping_address": sample_pool("address", num_transactions),
+        "total_amount": 0.00  # calculated later
+    })
 
-        transaction_totals[txn_id] = round(txn_total, 2)
 
-    
-    transactions_df["total_amount"] = transactions_df["transaction_id"].map(transaction_totals)
-
-    return pd.DataFrame(items)
+def generate_transaction_items(transactions_df: pd.DataFrame,
+                               products_df: pd.DataFrame,
+                               start_id: int = 1) -> pd.DataFrame:
+    # Draw every line item for the whole transaction set in one batch
+    num_transactions = len(transactions_df)
+    item_counts = rng.integers(1, 6, size=num_transactions)
+    txn_index = np.repeat(np.arange(num_transactions), item_counts)
+    num_items = len(txn_index)
+
+    product_index = rng.integers(0, len(products_df), size=num_items)
+    quantities = rng.integers(1, 5, size=num_items)
+    discounts = rng.choice(DISCOUNT_OPTIONS, size=num_items)
+
+    unit_prices = products_df["price"].to_numpy()[product_index]
+    line_totals = np.round(quantities * unit_prices * (1 - discounts / 100), 2)
+
+    items = pd.DataFrame({
+        "item_id": format_ids("ITEM", start_id, start_id + num_items, 5),
+        "transaction_id": transactions_df["transaction_id"].to_numpy()[txn_index],
+        "product_id": products_df["product_id"].to_numpy()[product_index],
+        "quantity": quantities,
+        "unit_price": unit_prices,
+        "discount_percentage": discounts,
+        "line_total": line_totals
+    })
+
+    # Grouped reduction of line totals per transaction
+    transaction_totals = np.bincount(txn_index, weights=line_totals, minlength=num_transactions)
+    transactions_df["total_amount"] = np.round(transaction_totals, 2)
+
+    return items
 
 
 def validate_referential_integrity(customers, products, transactions, items) -> dict:
@@ -143,37 +337,174 @@ def validate_referential_integrity(customers, products, transactions, items) ->
     }
 
 
+def append_csv(df: pd.DataFrame, table_name: str, first_chunk: bool):
+    df.to_csv(
+        f"data/raw/{table_name}.csv",
+        mode="w" if first_chunk else "a",
+        header=first_chunk,
+        index=False
+    )
+
+
+def append_parquet(df: pd.DataFrame, table_name: str):
+    # One writer per table stays open across chunks; every chunk (or every
+    # month of a chunk) becomes its own row group.
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    writer = parquet_writers.get(table_name)
+    if writer is None:
+        writer = pq.ParquetWriter(
+            f"data/raw/{table_name}.parquet", table.schema, compression=PARQUET_COMPRESSION
+        )
+        parquet_writers[table_name] = writer
+    else:
+        table = table.cast(writer.schema)
+
+    date_column = DATE_COLUMNS.get(table_name)
+    if PARQUET_ROW_GROUPS_BY_DATE and date_column:
+        months = pd.to_datetime(df[date_column]).dt.to_period("M").to_numpy()
+        for month in np.unique(months):
+            writer.write_table(table.filter(pa.array(months == month)))
+    else:
+        writer.write_table(table)
+
+
+def write_raw(df: pd.DataFrame, table_name: str, first_chunk: bool = True):
+    if RAW_FORMAT == "parquet":
+        append_parquet(df, table_name)
+    else:
+        append_csv(df, table_name, first_chunk)
+
+
+def close_raw_writers():
+    for writer in parquet_writers.values():
+        writer.close()
+    parquet_writers.clear()
+
+
+def num_shards(total: int, shard_size: int) -> int:
+    return -(-total // shard_size)
+
+
+def generate_streaming(shard_size: int, workers: int = 1) -> tuple:
+    # Only the product catalog and the customer ID key space stay in memory;
+    # every other frame lives for a single shard. Shards are merged in shard
+    # order, so the output does not depend on the number of workers.
+    record_counts = {
+        "customers": 0,
+        "products": 0,
+        "transactions": 0,
+        "transaction_items": 0
+    }
+    orphans = {
+        "customer_orphans": 0,
+        "product_orphans": 0,
+        "transaction_orphans": 0
+    }
+
+    # Faker's unique proxy only works within a shard, so email collisions
+    # across shards are resolved here in a deterministic way.
+    seen_emails = set()
+    customer_shards = run_shards(
+        generate_customer_shard, num_shards(cfg["customers"], shard_size), workers
+    )
+    for shard_index, customers_chunk in enumerate(customer_shards):
+        duplicated = (
+            customers_chunk["email"].isin(seen_emails) | customers_chunk["email"].duplicated()
+        )
+        customers_chunk.loc[duplicated, "email"] = (
+            customers_chunk.loc[duplicated, "customer_id"].str.lower()
+            + "." + customers_chunk.loc[duplicated, "email"]
+        )
+        seen_emails.update(customers_chunk["email"])
+
+        write_raw(customers_chunk, "customers", shard_index == 0)
+        record_counts["customers"] += len(customers_chunk)
+
+    product_shards = run_shards(
+        generate_product_shard, num_shards(cfg["products"], shard_size), workers
+    )
+    # Kept in memory (and shipped to every worker) for the whole run
+    products_df = schema_registry.apply_schema(
+        pd.concat(list(product_shards), ignore_index=True), "products"
+    )
+    write_raw(products_df, "products", True)
+    record_counts["products"] = len(products_df)
+
+    init_shard_worker(products_df)
+    transaction_shards = run_shards(
+        generate_transaction_shard, num_shards(cfg["transactions"], shard_size), workers,
+        initargs=(products_df,)
+    )
+    for shard_index, (transactions_chunk, items_chunk) in enumerate(transaction_shards):
+        item_offset = record_counts["transaction_items"]
+        items_chunk["item_id"] = format_ids(
+            "ITEM", item_offset + 1, item_offset + len(items_chunk) + 1, 5
+        )
+
+        write_raw(transactions_chunk, "transactions", shard_index == 0)
+        write_raw(items_chunk, "transaction_items", shard_index == 0)
+        record_counts["transactions"] += len(transactions_chunk)
+        record_counts["transaction_items"] += len(items_chunk)
+
+        # Items only reference transactions of their own shard
+        chunk_report = validate_referential_integrity(
+            shard_customer_keys, products_df, transactions_chunk, items_chunk
+        )
+        for key in orphans:
+            orphans[key] += chunk_report[key]
+
+    return record_counts, {**orphans, "quality_score": 100}
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic e-commerce data")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Generate seeded shards in a pool of N processes (implies streaming mode)"
+    )
+    args = parser.parse_args()
+
     print("Starting data generation...")
 
-    customers_df = generate_customers(cfg["customers"])
-    products_df = generate_products(cfg["products"])
-    transactions_df = generate_transactions(cfg["transactions"], customers_df)
-    items_df = generate_transaction_items(transactions_df, products_df)
+    if STREAMING or args.workers:
+        record_counts, integrity_report = generate_streaming(SHARD_SIZE, args.workers or 1)
+    else:
+        # Customers are written as generated, as in streaming mode, so both
+        # modes produce the same raw schema; the registry types them after.
+        customers_df = generate_customers(cfg["customers"])
+        write_raw(customers_df, "customers")
+        customers_df = schema_registry.apply_schema(customers_df, "customers")
+
+        products_df = schema_registry.apply_schema(generate_products(cfg["products"]), "products")
+        transactions_df = generate_transactions(cfg["transactions"], customers_df)
+        items_df = generate_transaction_items(transactions_df, products_df)
+
+        # Save raw files
+        write_raw(products_df, "products")
+        write_raw(transactions_df, "transactions")
+        write_raw(items_df, "transaction_items")
+
+        record_counts = {
+            "customers": len(customers_df),
+            "products": len(products_df),
+            "transactions": len(transactions_df),
+            "transaction_items": len(items_df)
+        }
+        integrity_report = validate_referential_integrity(
+            customers_df, products_df, transactions_df, items_df
+        )
 
-    # Save CSVs
-    customers_df.to_csv("data/raw/customers.csv", index=False)
-    products_df.to_csv("data/raw/products.csv", index=False)
-    transactions_df.to_csv("data/raw/transactions.csv", index=False)
-    items_df.to_csv("data/raw/transaction_items.csv", index=False)
+    close_raw_writers()
 
     # Metadata
-    integrity_report = validate_referential_integrity(
-        customers_df, products_df, transactions_df, items_df
-    )
-
     metadata = {
         "generated_at": datetime.now().isoformat(),
         "date_range": {
             "start_date": cfg["start_date"],
             "end_date": cfg["end_date"]
         },
-        "record_counts": {
-            "customers": len(customers_df),
-            "products": len(products_df),
-            "transactions": len(transactions_df),
-            "transaction_items": len(items_df)
-        },
+        "raw_format": RAW_FORMAT,
+        "record_counts": record_counts,
         "referential_integrity": integrity_report
     }
 
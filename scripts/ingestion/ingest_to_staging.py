@@ -1,11 +1,23 @@
 import pandas as pd
+import argparse
+import csv
+import hashlib
+import io
 import json
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import os
+import sys
 import yaml
+import pyarrow.parquet as pq
 from datetime import datetime
 from sqlalchemy import create_engine, text
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import schema_registry  # noqa: E402
+
 
 with open("config/config.yaml", "r") as f:
     config = yaml.safe_load(f)
@@ -41,9 +53,15 @@ ENGINE_URL = (
 
 PIPELINE_CFG = config.get("pipeline", {})
 BATCH_SIZE = PIPELINE_CFG.get("batch_size", 1000)
+LOAD_METHOD = PIPELINE_CFG.get("load_method", "copy")
+STREAMING_INGESTION = PIPELINE_CFG.get("streaming_ingestion", False)
+INGESTION_WORKERS = PIPELINE_CFG.get("ingestion_workers", 1)
+SHADOW_SUFFIX = "_next"
 
 RAW_DATA_PATH = "data/raw"
+RAW_FORMAT = config.get("data_generation", {}).get("raw_format", "csv")
 OUTPUT_PATH = "data/staging"
+MANIFEST_PATH = os.path.join(OUTPUT_PATH, "ingestion_manifest.json")
 os.makedirs(OUTPUT_PATH, exist_ok=True)
 
 TABLE_ORDER = [
@@ -53,27 +71,111 @@ TABLE_ORDER = [
     "transaction_items"
 ]
 
+PRIMARY_KEYS = {
+    "customers": "customer_id",
+    "products": "product_id",
+    "transactions": "transaction_id",
+    "transaction_items": "item_id"
+}
 
-def load_csv_to_staging(csv_path: str, table_name: str, connection) -> dict:
-    df = pd.read_csv(csv_path)
+# High-water mark column per table for incremental loads. Only append-only
+# facts use one: customers and products can be added or edited under any date,
+# so they are upserted in full by key. Items follow their transactions.
+WATERMARK_COLUMNS = {
+    "transactions": "transaction_date"
+}
 
-    df.to_sql(
-        table_name,
-        connection,
-        schema="staging",
-        if_exists="append",
-        index=False,
-        method="multi",
-        chunksize=BATCH_SIZE
+# Only empty CSV fields are NULL, as with COPY; words like "None" or "NA"
+# that Faker can produce stay literal values.
+CSV_READ_OPTIONS = {"keep_default_na": False, "na_values": [""]}
+
+# Columns projected out of the raw files, in staging table order
+STAGING_COLUMNS = {
+    "customers": [
+        "customer_id", "first_name", "last_name", "email", "phone",
+        "registration_date", "city", "state", "country", "age_group"
+    ],
+    "products": [
+        "product_id", "product_name", "category", "sub_category", "price",
+        "cost", "brand", "stock_quantity", "supplier_id"
+    ],
+    "transactions": [
+        "transaction_id", "customer_id", "transaction_date", "transaction_time",
+        "payment_method", "shipping_address", "total_amount"
+    ],
+    "transaction_items": [
+        "item_id", "transaction_id", "product_id", "quantity", "unit_price",
+        "discount_percentage", "line_total"
+    ]
+}
+
+
+def rows_per_second(rows: int, start_time: float) -> float:
+    elapsed = time.time() - start_time
+    return round(rows / elapsed, 2) if elapsed > 0 else None
+
+
+def copy_to_staging(buffer, table_name: str, columns: list, connection,
+                    header: bool = False, schema: str = "staging") -> int:
+    # COPY runs on the DBAPI connection behind the SQLAlchemy one, so it
+    # shares the surrounding transaction.
+    options = "FORMAT csv, HEADER true" if header else "FORMAT csv"
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {schema}.{table_name} ({', '.join(columns)}) FROM STDIN WITH ({options})",
+            buffer
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def load_csv_to_staging(csv_path: str, table_name: str, connection,
+                        target: str = None) -> dict:
+    start_time = time.time()
+    target = target or table_name
+
+    if LOAD_METHOD == "copy":
+        # Stream the file as-is; Postgres parses it server-side
+        with open(csv_path, "r", newline="") as f:
+            columns = next(csv.reader(f))
+            f.seek(0)
+            rows_loaded = copy_to_staging(f, target, columns, connection, header=True)
+    else:
+        rows_loaded = bulk_insert_data(
+            schema_registry.read_csv(csv_path, table_name, **CSV_READ_OPTIONS), target, connection
+        )
+
+    return {
+        "rows_loaded": rows_loaded,
+        "status": "success",
+        "rows_per_second": rows_per_second(rows_loaded, start_time)
+    }
+
+
+def load_parquet_to_staging(parquet_path: str, table_name: str, connection,
+                            target: str = None) -> dict:
+    start_time = time.time()
+    df = schema_registry.apply_schema(
+        pd.read_parquet(parquet_path, columns=STAGING_COLUMNS[table_name]), table_name
     )
+    rows_loaded = bulk_insert_data(df, target or table_name, connection)
 
     return {
-        "rows_loaded": len(df),
-        "status": "success"
+        "rows_loaded": rows_loaded,
+        "status": "success",
+        "rows_per_second": rows_per_second(rows_loaded, start_time)
     }
 
 
 def bulk_insert_data(df: pd.DataFrame, table_name: str, connection) -> int:
+    if LOAD_METHOD == "copy":
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        return copy_to_staging(buffer, table_name, list(df.columns), connection)
+
     df.to_sql(
         table_name,
         connection,
@@ -86,6 +188,392 @@ def bulk_insert_data(df: pd.DataFrame, table_name: str, connection) -> int:
     return len(df)
 
 
+def iter_raw_chunks(raw_path: str, table_name: str, chunk_size: int):
+    if raw_path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(raw_path)
+        for batch in parquet_file.iter_batches(
+            batch_size=chunk_size, columns=STAGING_COLUMNS[table_name]
+        ):
+            yield schema_registry.apply_schema(batch.to_pandas(), table_name)
+    else:
+        yield from schema_registry.read_csv(
+            raw_path, table_name, chunksize=chunk_size, **CSV_READ_OPTIONS
+        )
+
+
+def prefetch(chunks, depth: int = 1):
+    # Parse the next chunk on a reader thread while the current one is
+    # loaded; the bounded queue caps how many chunks are held at once.
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+
+    def reader():
+        try:
+            for chunk in chunks:
+                buffer.put(chunk)
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(done)
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    while True:
+        chunk = buffer.get()
+        if chunk is done:
+            return
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+
+
+def stream_to_staging(raw_path: str, table_name: str, connection,
+                      target: str = None) -> dict:
+    start_time = time.time()
+    rows_loaded = 0
+    chunks_loaded = 0
+
+    for chunk in prefetch(iter_raw_chunks(raw_path, table_name, BATCH_SIZE)):
+        rows_loaded += bulk_insert_data(chunk, target or table_name, connection)
+        chunks_loaded += 1
+
+    return {
+        "rows_loaded": rows_loaded,
+        "chunks_loaded": chunks_loaded,
+        "status": "success",
+        "rows_per_second": rows_per_second(rows_loaded, start_time)
+    }
+
+
+def raw_file_path(table_name: str) -> str:
+    raw_file = os.path.join(RAW_DATA_PATH, f"{table_name}.{RAW_FORMAT}")
+    if not os.path.exists(raw_file):
+        raise FileNotFoundError(f"Missing raw file: {raw_file}")
+    return raw_file
+
+
+def load_raw_file(raw_file: str, table_name: str, connection, target: str = None) -> dict:
+    if STREAMING_INGESTION:
+        return stream_to_staging(raw_file, table_name, connection, target)
+    if RAW_FORMAT == "parquet":
+        return load_parquet_to_staging(raw_file, table_name, connection, target)
+    return load_csv_to_staging(raw_file, table_name, connection, target)
+
+
+# -------------------------------------------------
+# PARALLEL INGESTION (SHADOW TABLES)
+# -------------------------------------------------
+def create_shadow_tables(engine, tables: list):
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(f"DROP TABLE IF EXISTS staging.{table}{SHADOW_SUFFIX}"))
+            conn.execute(text(
+                f"CREATE TABLE staging.{table}{SHADOW_SUFFIX} "
+                f"(LIKE staging.{table} INCLUDING ALL)"
+            ))
+
+
+def drop_shadow_tables(engine, tables: list):
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(f"DROP TABLE IF EXISTS staging.{table}{SHADOW_SUFFIX}"))
+
+
+def swap_shadow_tables(engine, tables: list):
+    # One transaction: readers see either every old table or every new one
+    with engine.begin() as conn:
+        for table in tables:
+            shadow = f"{table}{SHADOW_SUFFIX}"
+            index_names = conn.execute(text("""
+                SELECT indexname FROM pg_indexes
+                WHERE schemaname = 'staging' AND tablename = :shadow
+            """), {"shadow": shadow}).scalars().all()
+
+            conn.execute(text(f"DROP TABLE staging.{table}"))
+            conn.execute(text(f"ALTER TABLE staging.{shadow} RENAME TO {table}"))
+
+            # Give the indexes their regular names back so the next run can
+            # create its shadow indexes again
+            for index_name in index_names:
+                conn.execute(text(
+                    f"ALTER INDEX staging.{index_name} "
+                    f"RENAME TO {index_name.replace(shadow, table, 1)}"
+                ))
+
+
+def ingest_parallel(engine, workers: int) -> dict:
+    # Tables (or, in streaming mode, chunks of a table) load into shadow
+    # tables on separate pooled connections. Each task commits on its own;
+    # the shadow tables only become visible through the final swap.
+    def load_file(raw_file, table):
+        with engine.begin() as conn:
+            return load_raw_file(raw_file, table, conn, target=f"{table}{SHADOW_SUFFIX}")
+
+    def load_chunk(chunk, table):
+        with engine.begin() as conn:
+            return bulk_insert_data(chunk, f"{table}{SHADOW_SUFFIX}", conn)
+
+    create_shadow_tables(engine, TABLE_ORDER)
+    tables_loaded = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if STREAMING_INGESTION:
+                in_flight = threading.BoundedSemaphore(workers * 2)
+
+                def load_chunk_bounded(chunk, table):
+                    try:
+                        return load_chunk(chunk, table)
+                    finally:
+                        in_flight.release()
+
+                chunk_futures = {table: [] for table in TABLE_ORDER}
+                start_times = {}
+                for table in TABLE_ORDER:
+                    start_times[table] = time.time()
+                    for chunk in iter_raw_chunks(raw_file_path(table), table, BATCH_SIZE):
+                        in_flight.acquire()
+                        chunk_futures[table].append(
+                            executor.submit(load_chunk_bounded, chunk, table)
+                        )
+
+                for table, futures in chunk_futures.items():
+                    rows_loaded = sum(future.result() for future in futures)
+                    tables_loaded[f"staging.{table}"] = {
+                        "rows_loaded": rows_loaded,
+                        "chunks_loaded": len(futures),
+                        "status": "success",
+                        "rows_per_second": rows_per_second(rows_loaded, start_times[table])
+                    }
+            else:
+                file_futures = {
+                    table: executor.submit(load_file, raw_file_path(table), table)
+                    for table in TABLE_ORDER
+                }
+                for table, future in file_futures.items():
+                    tables_loaded[f"staging.{table}"] = future.result()
+
+        swap_shadow_tables(engine, TABLE_ORDER)
+    except Exception:
+        drop_shadow_tables(engine, TABLE_ORDER)
+        raise
+
+    return tables_loaded
+
+
+# -------------------------------------------------
+# INCREMENTAL INGESTION (WATERMARKS + UPSERT)
+# -------------------------------------------------
+def ensure_ingestion_state(connection):
+    # Same definition as the staging DDL, for databases created before it
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS staging.ingestion_state (
+            table_name VARCHAR(50) PRIMARY KEY,
+            watermark VARCHAR(50),
+            rows_loaded BIGINT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def get_watermarks(connection) -> dict:
+    rows = connection.execute(text(
+        "SELECT table_name, watermark FROM staging.ingestion_state"
+    )).fetchall()
+    return {row.table_name: row.watermark for row in rows}
+
+
+def save_watermark(connection, table_name: str, watermark, rows_loaded: int):
+    connection.execute(text("""
+        INSERT INTO staging.ingestion_state (table_name, watermark, rows_loaded, updated_at)
+        VALUES (:table_name, :watermark, :rows_loaded, CURRENT_TIMESTAMP)
+        ON CONFLICT (table_name) DO UPDATE SET
+            watermark = EXCLUDED.watermark,
+            rows_loaded = EXCLUDED.rows_loaded,
+            updated_at = EXCLUDED.updated_at
+    """), {"table_name": table_name, "watermark": watermark, "rows_loaded": rows_loaded})
+
+
+def reset_watermarks(connection):
+    # After a full refresh the watermarks restart from what is in staging
+    for table in TABLE_ORDER:
+        watermark = None
+        if table in WATERMARK_COLUMNS:
+            watermark = connection.execute(text(
+                f"SELECT MAX({WATERMARK_COLUMNS[table]})::TEXT FROM staging.{table}"
+            )).scalar()
+        rows_loaded = connection.execute(text(f"SELECT COUNT(*) FROM staging.{table}")).scalar()
+        save_watermark(connection, table, watermark, rows_loaded)
+
+
+def incremental_row_filter(table_name: str, watermark, follow_transactions: bool) -> str:
+    # Rows on the watermark date itself are reloaded to catch late arrivals;
+    # the upsert makes that idempotent. Rows whose key is not in staging yet
+    # are kept whatever their date, so every row of the file gets applied.
+    key = PRIMARY_KEYS[table_name]
+    if table_name in WATERMARK_COLUMNS and watermark:
+        selected = f"d.{WATERMARK_COLUMNS[table_name]} >= CAST(:watermark AS DATE)"
+    elif table_name == "transaction_items" and follow_transactions:
+        selected = "d.transaction_id IN (SELECT transaction_id FROM selected_transactions)"
+    else:
+        return ""
+    return f"""
+        WHERE {selected} OR NOT EXISTS (
+            SELECT 1 FROM staging.{table_name} s WHERE s.{key} = d.{key}
+        )
+    """
+
+
+def upsert_incremental(raw_file: str, table_name: str, connection, watermark,
+                       follow_transactions: bool = False) -> dict:
+    start_time = time.time()
+    columns = STAGING_COLUMNS[table_name]
+    key = PRIMARY_KEYS[table_name]
+    delta = f"delta_{table_name}"
+
+    connection.execute(text(
+        f"CREATE TEMP TABLE {delta} (LIKE staging.{table_name} INCLUDING DEFAULTS) "
+        f"ON COMMIT DROP"
+    ))
+
+    # The whole file goes to the temp table; which rows to apply is decided
+    # in Postgres against the staging primary key
+    rows_read = 0
+    for chunk in prefetch(iter_raw_chunks(raw_file, table_name, BATCH_SIZE)):
+        buffer = io.StringIO()
+        chunk[columns].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        rows_read += copy_to_staging(buffer, delta, columns, connection, schema="pg_temp")
+
+    row_filter = incremental_row_filter(table_name, watermark, follow_transactions)
+    params = {"watermark": watermark}
+
+    new_watermark = watermark
+    if table_name in WATERMARK_COLUMNS:
+        delta_max = connection.execute(text(
+            f"SELECT MAX(d.{WATERMARK_COLUMNS[table_name]})::TEXT FROM {delta} d {row_filter}"
+        ), params).scalar()
+        new_watermark = max(filter(None, [watermark, delta_max]), default=None)
+    if table_name == "transactions" and row_filter:
+        # Items of these transactions are picked up by the items upsert
+        connection.execute(text("DROP TABLE IF EXISTS selected_transactions"))
+        connection.execute(text(
+            f"CREATE TEMP TABLE selected_transactions ON COMMIT DROP AS "
+            f"SELECT d.transaction_id FROM {delta} d {row_filter}"
+        ), params)
+
+    # Only rows whose values actually changed are rewritten, so loaded_at
+    # keeps marking the real changes for downstream steps.
+    non_key = [c for c in columns if c != key]
+    result = connection.execute(text(f"""
+        INSERT INTO staging.{table_name} ({', '.join(columns)})
+        SELECT {', '.join(f"d.{c}" for c in columns)} FROM {delta} d
+        {row_filter}
+        ON CONFLICT ({key}) DO UPDATE SET
+            {', '.join(f"{c} = EXCLUDED.{c}" for c in non_key)},
+            loaded_at = CURRENT_TIMESTAMP
+        WHERE ({', '.join(f"staging.{table_name}.{c}" for c in non_key)})
+            IS DISTINCT FROM ({', '.join(f"EXCLUDED.{c}" for c in non_key)})
+    """), params)
+    connection.execute(text(f"DROP TABLE {delta}"))
+
+    return {
+        "rows_read": rows_read,
+        "rows_loaded": result.rowcount,
+        "watermark": new_watermark,
+        "status": "success",
+        "rows_per_second": rows_per_second(rows_read, start_time)
+    }
+
+
+# -------------------------------------------------
+# RAW FILE MANIFEST (SKIP UNCHANGED INPUTS)
+# -------------------------------------------------
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r") as f:
+        return json.load(f)
+
+
+def is_unchanged(table_name: str, raw_file: str, manifest: dict, connection) -> bool:
+    entry = manifest.get(table_name)
+    if not entry or entry["file"] != raw_file:
+        return False
+
+    stat = os.stat(raw_file)
+    if stat.st_size != entry["size"]:
+        return False
+    # The generator rewrites every file, so a new mtime alone is not a change
+    if stat.st_mtime != entry["mtime"] and file_hash(raw_file) != entry["hash"]:
+        return False
+
+    row_count = connection.execute(text(f"SELECT COUNT(*) FROM staging.{table_name}")).scalar()
+    return row_count == entry["row_count"]
+
+
+def write_manifest(manifest: dict, row_counts: dict):
+    # Only called once the load has committed. The incremental filter never
+    # skips a row that is missing from staging, so a stored hash always
+    # stands for a fully applied file.
+    updated = {}
+    for table in TABLE_ORDER:
+        raw_file = raw_file_path(table)
+        stat = os.stat(raw_file)
+        entry = manifest.get(table, {})
+
+        # Reuse the stored hash when the file was not touched at all
+        unchanged = (
+            entry.get("file") == raw_file
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime") == stat.st_mtime
+        )
+        updated[table] = {
+            "file": raw_file,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": entry["hash"] if unchanged else file_hash(raw_file),
+            "row_count": row_counts[table]
+        }
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(updated, f, indent=4)
+
+
+def ingest_incremental(connection, manifest: dict) -> dict:
+    watermarks = get_watermarks(connection)
+    tables_loaded = {}
+    follow_transactions = False
+
+    for table in TABLE_ORDER:
+        raw_file = raw_file_path(table)
+        if is_unchanged(table, raw_file, manifest, connection):
+            tables_loaded[f"staging.{table}"] = {
+                "rows_loaded": 0,
+                "status": "skipped",
+                "reason": "raw file and staging row count unchanged"
+            }
+            continue
+
+        result = upsert_incremental(
+            raw_file, table, connection, watermarks.get(table), follow_transactions
+        )
+        if table == "transactions" and watermarks.get(table):
+            follow_transactions = True
+
+        save_watermark(connection, table, result["watermark"], result["rows_loaded"])
+        tables_loaded[f"staging.{table}"] = result
+
+    return tables_loaded
+
+
 def validate_staging_load(connection) -> dict:
     results = {}
     for table in TABLE_ORDER:
@@ -97,37 +585,63 @@ def validate_staging_load(connection) -> dict:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load raw files into the staging schema")
+    parser.add_argument(
+        "--full-refresh", action="store_true",
+        help="Truncate and reload every staging table instead of loading new rows only"
+    )
+    args = parser.parse_args()
+
     start_time = time.time()
-    engine = create_engine(ENGINE_URL)
+    engine = create_engine(
+        ENGINE_URL,
+        pool_size=max(INGESTION_WORKERS, 1),
+        max_overflow=0
+    )
 
     ingestion_report = {
         "ingestion_timestamp": datetime.now().isoformat(),
+        "mode": None,
         "tables_loaded": {},
         "row_counts": {},
         "total_execution_time_seconds": None
     }
 
     try:
-       
         with engine.begin() as conn:
-            # Truncate tables (reverse order for safety)
-            for table in reversed(TABLE_ORDER):
-                conn.execute(text(f"TRUNCATE TABLE staging.{table}"))
+            ensure_ingestion_state(conn)
+            # Without any watermark yet, the first run is a full load
+            full_refresh = args.full_refresh or not get_watermarks(conn)
+        ingestion_report["mode"] = "full_refresh" if full_refresh else "incremental"
+
+        # --full-refresh always reloads; otherwise unchanged tables are skipped
+        manifest = {} if args.full_refresh else load_manifest()
 
-            # Load CSV files
-            for table in TABLE_ORDER:
-                csv_file = os.path.join(RAW_DATA_PATH, f"{table}.csv")
+        if not full_refresh:
+            with engine.begin() as conn:
+                ingestion_report["tables_loaded"] = ingest_incremental(conn, manifest)
+        elif INGESTION_WORKERS > 1:
+            ingestion_report["tables_loaded"] = ingest_parallel(engine, INGESTION_WORKERS)
+            with engine.begin() as conn:
+                reset_watermarks(conn)
+        else:
+            with engine.begin() as conn:
+                # Truncate tables (reverse order for safety)
+                for table in reversed(TABLE_ORDER):
+                    conn.execute(text(f"TRUNCATE TABLE staging.{table}"))
 
-                if not os.path.exists(csv_file):
-                    raise FileNotFoundError(f"Missing CSV file: {csv_file}")
+                # Load raw files
+                for table in TABLE_ORDER:
+                    result = load_raw_file(raw_file_path(table), table, conn)
+                    ingestion_report["tables_loaded"][f"staging.{table}"] = result
 
-                result = load_csv_to_staging(csv_file, table, conn)
-                ingestion_report["tables_loaded"][f"staging.{table}"] = result
+                reset_watermarks(conn)
 
-       
         with engine.connect() as conn:
             ingestion_report["row_counts"] = validate_staging_load(conn)
 
+        write_manifest(manifest, ingestion_report["row_counts"])
+
         ingestion_report["total_execution_time_seconds"] = round(
             time.time() - start_time, 2
         )
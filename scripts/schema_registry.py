@@ -0,0 +1,100 @@
+import pandas as pd
+
+# -------------------------------------------------
+# DTYPE REGISTRY FOR THE FOUR PIPELINE ENTITIES
+# -------------------------------------------------
+# Every stage loads entity data through here instead of relying on pandas
+# inference:
+#   - IDs and free text   -> pyarrow-backed strings
+#   - low-cardinality     -> category
+#   - counts              -> nullable compact ints
+#   - money / percentages -> float64 (they land in DECIMAL columns, and
+#                            float32 would not round-trip through CSV/COPY)
+#   - dates               -> datetime64, always parsed as YYYY-MM-DD
+STRING = "string[pyarrow]"
+CATEGORY = "category"
+DATE = "date"
+
+SCHEMAS = {
+    "customers": {
+        "customer_id": STRING,
+        "first_name": STRING,
+        "last_name": STRING,
+        "email": STRING,
+        "phone": STRING,
+        "registration_date": DATE,
+        "city": STRING,
+        "state": CATEGORY,
+        "country": CATEGORY,
+        "age_group": CATEGORY,
+    },
+    "products": {
+        "product_id": STRING,
+        "product_name": STRING,
+        "category": CATEGORY,
+        "sub_category": CATEGORY,
+        "price": "float64",
+        "cost": "float64",
+        "brand": STRING,
+        "stock_quantity": "Int32",
+        "supplier_id": CATEGORY,
+    },
+    "transactions": {
+        "transaction_id": STRING,
+        "customer_id": STRING,
+        "transaction_date": DATE,
+        "transaction_time": STRING,
+        "payment_method": CATEGORY,
+        "shipping_address": STRING,
+        "total_amount": "float64",
+    },
+    "transaction_items": {
+        "item_id": STRING,
+        "transaction_id": STRING,
+        "product_id": CATEGORY,
+        "quantity": "Int16",
+        "unit_price": "float64",
+        "discount_percentage": "float64",
+        "line_total": "float64",
+    },
+}
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def date_columns(table_name: str) -> list:
+    return [column for column, dtype in SCHEMAS[table_name].items() if dtype == DATE]
+
+
+def pandas_dtypes(table_name: str) -> dict:
+    return {column: dtype for column, dtype in SCHEMAS[table_name].items() if dtype != DATE}
+
+
+def apply_schema(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    # Columns outside the registry (derived ones like profit_margin) are
+    # left as they are.
+    dtypes = {c: t for c, t in pandas_dtypes(table_name).items() if c in df.columns}
+    df = df.astype(dtypes)
+    for column in date_columns(table_name):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format=DATE_FORMAT)
+    return df
+
+
+def read_csv(path, table_name: str, **kwargs):
+    # dtype is applied by the CSV parser itself; with chunksize this returns
+    # an iterator of typed chunks, as pd.read_csv does.
+    return pd.read_csv(
+        path,
+        dtype=pandas_dtypes(table_name),
+        parse_dates=date_columns(table_name),
+        date_format=DATE_FORMAT,
+        **kwargs
+    )
+
+
+def read_sql(sql, connection, table_name: str, **kwargs):
+    result = pd.read_sql(sql, connection, **kwargs)
+    if kwargs.get("chunksize"):
+        return (apply_schema(chunk, table_name) for chunk in result)
+    return apply_schema(result, table_name)
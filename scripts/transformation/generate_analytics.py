@@ -64,28 +64,96 @@ def generate_summary(results, total_time):
     }
 
 
+# ---------------- AGGREGATE ROUTING ----------------
+# What each aggregate can answer: the grain its rows are keyed by (attributes
+# of that dimension can still be joined in) and the measures that stay
+# correct when its rows are rolled up. Queries declare their own grain and
+# measures with "-- Qn needs: <grain> | <measures>" in SQL_FILE.
+AGGREGATE_COVERAGE = {
+    "agg_daily_sales": {
+        "grain": "date",
+        "measures": {"revenue", "profit", "transactions"},
+    },
+    "agg_product_performance": {
+        "grain": "product",
+        "measures": {"revenue", "profit", "quantity", "unit_price", "discount", "lines"},
+    },
+    "agg_customer_metrics": {
+        "grain": "customer",
+        "measures": {"revenue", "transactions", "lines", "customers"},
+    },
+}
+FACT_SOURCE = "fact_sales"
+
+# -- Q1 | -- Q1 needs: product | revenue, quantity | -- Q1 @ agg_product_performance
+QUERY_MARKER = re.compile(
+    r"^--\s*Q(\d+)\s*(?:@\s*(\w+)|needs:\s*(\w+)\s*\|\s*(.*?))?\s*$",
+    re.MULTILINE,
+)
 
 
 def load_queries():
     with open(SQL_FILE, "r") as f:
         sql_text = f.read()
 
-    # Split on -- Q1, -- Q2, -- Q10 ...
-    parts = re.split(r"--\s*Q\d+.*", sql_text)
-
-    queries = []
-    for part in parts:
-        sql = part.strip()
-
-        if not sql:
+    markers = list(QUERY_MARKER.finditer(sql_text))
+    queries = {}
+    for marker, following in zip(markers, markers[1:] + [None]):
+        sql = sql_text[marker.end():following.start() if following else None].strip()
+        if not re.search(r"\bselect\b", sql, re.IGNORECASE):
             continue
 
-        if re.search(r"\bselect\b", sql, re.IGNORECASE):
-            queries.append(sql)
-
-    return queries
-
-
+        number, source, grain, measures = marker.groups()
+        query = queries.setdefault(int(number), {"variants": {}})
+        if source:
+            query["variants"][source] = sql
+        else:
+            query["sql"] = sql
+            query["grain"] = grain
+            query["measures"] = {m.strip() for m in (measures or "").split(",") if m.strip()}
+
+    return [dict(query, number=number) for number, query in sorted(queries.items())]
+
+
+def covers(source, query):
+    coverage = AGGREGATE_COVERAGE.get(source)
+    return (
+        coverage is not None
+        and query["grain"] == coverage["grain"]
+        and query["measures"] <= coverage["measures"]
+    )
+
+
+def source_size(connection, source):
+    # On-disk size of a populated source, None if it is missing or empty
+    # (e.g. a warehouse loaded before the aggregates existed)
+    name = f"warehouse.{source}"
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+        return None
+    if not connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+        return None
+    # Partitioned tables report their partitions through pg_partition_tree
+    return connection.execute(text("""
+        SELECT COALESCE(
+            (SELECT SUM(pg_relation_size(relid)) FROM pg_partition_tree(CAST(:name AS regclass))),
+            pg_relation_size(CAST(:name AS regclass))
+        )
+    """), {"name": name}).scalar()
+
+
+def route_query(connection, query):
+    # Smallest populated aggregate that covers the query, else the fact table
+    candidates = []
+    for source, sql in query["variants"].items():
+        if covers(source, query):
+            size = source_size(connection, source)
+            if size is not None:
+                candidates.append((size, source, sql))
+
+    if candidates:
+        _, source, sql = min(candidates)
+        return sql, source
+    return query["sql"], FACT_SOURCE
 
 
 if __name__ == "__main__":
@@ -94,8 +162,10 @@ if __name__ == "__main__":
     start_time = time.time()
 
     with engine.connect() as conn:
-        for i, sql in enumerate(queries, start=1):
-            print(f"Executing Query {i}")
+        for query in queries:
+            i = query["number"]
+            sql, source = route_query(conn, query)
+            print(f"Executing Query {i} (from warehouse.{source})")
             df, exec_time = execute_query(conn, sql)
             export_to_csv(df, CSV_NAMES[i])
 
@@ -103,6 +173,7 @@ if __name__ == "__main__":
                 "rows": len(df),
                 "columns": len(df.columns),
                 "execution_time_ms": exec_time,
+                "source": f"warehouse.{source}",
             }
 
     summary = generate_summary(results, time.time() - start_time)
@@ -1,8 +1,19 @@
 import os
 import yaml
+from contextlib import nullcontext
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+from schema_management import (
+    RETIRED_SUFFIX,
+    build_indexes,
+    create_shadow_schema,
+    deferred_indexes,
+    drop_retired_schema,
+    shadow_name,
+    swap_schema,
+)
+
 with open("config/config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
@@ -21,6 +32,22 @@ ENGINE_URL = (
 
 engine = create_engine(ENGINE_URL)
 
+SHADOW_SWAP = config.get("pipeline", {}).get("shadow_swap", False)
+DEFERRED_INDEXES = config.get("pipeline", {}).get("deferred_indexes", False)
+INDEX_BUILD_OPTIONS = {
+    "maintenance_workers": config.get("pipeline", {}).get("maintenance_workers", 2),
+    "maintenance_work_mem": config.get("pipeline", {}).get("maintenance_work_mem", "256MB"),
+}
+LOAD_STRATEGY = config.get("warehouse", {}).get("load_strategy", "full")
+RETENTION_MONTHS = config.get("warehouse", {}).get("retention_months", 0)
+RETENTION_ACTION = config.get("warehouse", {}).get("retention_action", "detach")
+ARCHIVE_SCHEMA = "warehouse_archive"
+
+# Dimensions are maintained in place across loads (SCD2 for customers and
+# products), so their surrogate keys never change; full loads only rebuild
+# facts and aggregates, and shadow loads copy the dimensions over.
+DIMENSION_TABLES = ("dim_date", "dim_payment_method", "dim_customers", "dim_products")
+
 
 def truncate_warehouse_tables(conn):
     conn.execute(text("""
@@ -28,16 +55,86 @@ def truncate_warehouse_tables(conn):
             warehouse.fact_sales,
             warehouse.agg_daily_sales,
             warehouse.agg_product_performance,
-            warehouse.agg_customer_metrics,
-            warehouse.dim_customers,
-            warehouse.dim_products,
-            warehouse.dim_payment_method,
-            warehouse.dim_date
+            warehouse.agg_customer_metrics
     """))
-    print(" Warehouse tables truncated safely")
+    print(" Warehouse fact and aggregate tables truncated safely")
+
+
+# -------------------------------------------------
+# FACT_SALES MONTHLY PARTITIONS + RETENTION
+# -------------------------------------------------
+def month_bounds(month: pd.Period) -> tuple:
+    lower = int(month.start_time.strftime("%Y%m%d"))
+    upper = int((month + 1).start_time.strftime("%Y%m%d"))
+    return lower, upper
+
+
+def ensure_fact_partitions(conn, schema, start_date, end_date, cutoff=None):
+    # One partition per month; months that fall before the retention
+    # cutoff are not (re)created.
+    created = 0
+    for month in pd.period_range(start_date, end_date, freq="M"):
+        lower, upper = month_bounds(month)
+        if cutoff is not None and upper <= cutoff:
+            continue
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.fact_sales_p{month.strftime("%Y%m")}
+            PARTITION OF {schema}.fact_sales
+            FOR VALUES FROM ({lower}) TO ({upper})
+        """))
+        created += 1
+    print(f"fact_sales partitions ready: {created} months")
+
+
+def list_fact_partitions(conn, schema="warehouse") -> list:
+    # (name, upper bound) for each attached partition, oldest first
+    rows = conn.execute(text("""
+        SELECT c.relname,
+               pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+        ORDER BY c.relname
+    """), {"parent": f"{schema}.fact_sales"}).fetchall()
+    return [(row.relname, int(row.bound.rsplit("(", 1)[1].rstrip(")"))) for row in rows]
+
+
+def retention_cutoff(conn):
+    # First date_key kept: the start of the month retention_months back
+    # from the newest sale. None when retention is off.
+    if not RETENTION_MONTHS:
+        return None
+    newest = conn.execute(text(
+        "SELECT MAX(transaction_date) FROM production.transactions"
+    )).scalar()
+    lower, _ = month_bounds(pd.Period(newest, freq="M") - (RETENTION_MONTHS - 1))
+    return lower
 
 
-def load_dim_date(conn):
+def retire_fact_partitions(conn, cutoff, action="detach", schema="warehouse"):
+    # Whole months only, so retiring old sales is a catalog change rather
+    # than a DELETE. Detached partitions move to warehouse_archive, where
+    # truncates and shadow swaps of the warehouse schema leave them alone.
+    if cutoff is None:
+        return []
+    if action == "detach":
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+    retired = [name for name, upper in list_fact_partitions(conn, schema) if upper <= cutoff]
+    for name in retired:
+        if action == "drop":
+            conn.execute(text(f"DROP TABLE {schema}.{name}"))
+        else:
+            conn.execute(text(f"ALTER TABLE {schema}.fact_sales DETACH PARTITION {schema}.{name}"))
+            conn.execute(text(f"ALTER TABLE {schema}.{name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        print(f"fact_sales partition {name} retired ({action})")
+
+    conn.execute(text(f"DELETE FROM {schema}.agg_daily_sales WHERE date_key < :cutoff"),
+                 {"cutoff": cutoff})
+    return retired
+
+
+def load_dim_date(conn, schema="warehouse", cutoff=None):
     result = conn.execute(text("""
         SELECT 
             MIN(transaction_date) AS min_date,
@@ -62,78 +159,163 @@ def load_dim_date(conn):
     df["is_weekend"] = df["day_name"].isin(["Saturday", "Sunday"])
     df["is_holiday"] = False
 
+    # Incremental runs keep the existing calendar and only add new days
+    existing = conn.execute(text(f"SELECT date_key FROM {schema}.dim_date")).scalars().all()
+    df = df[~df["date_key"].isin(existing)]
+
     df.to_sql(
         "dim_date",
         conn,
-        schema="warehouse",
+        schema=schema,
         if_exists="append",
         index=False,
         method="multi"
     )
 
-    print(f"dim_date loaded: {len(df)} rows ({start_date} → {end_date})")
+    print(f"dim_date loaded: {len(df)} new rows ({start_date} → {end_date})")
 
+    ensure_fact_partitions(conn, schema, start_date, end_date, cutoff)
 
-def load_dim_payment_method(conn):
-    conn.execute(text("""
-        INSERT INTO warehouse.dim_payment_method (payment_method_name, payment_type)
+
+def load_dim_payment_method(conn, schema="warehouse"):
+    # NOT EXISTS rather than ON CONFLICT: a shadow schema has no unique
+    # index yet while it is being loaded
+    conn.execute(text(f"""
+        INSERT INTO {schema}.dim_payment_method (payment_method_name, payment_type)
         SELECT DISTINCT
-            payment_method,
+            t.payment_method,
             CASE
-                WHEN payment_method = 'Cash on Delivery' THEN 'Offline'
+                WHEN t.payment_method = 'Cash on Delivery' THEN 'Offline'
                 ELSE 'Online'
             END
-        FROM production.transactions
-        ON CONFLICT (payment_method_name) DO NOTHING;
+        FROM production.transactions t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {schema}.dim_payment_method dpm
+            WHERE dpm.payment_method_name = t.payment_method
+        );
     """))
     print("dim_payment_method loaded")
 
 
-def load_dim_customers(conn):
-    conn.execute(text("""
-        INSERT INTO warehouse.dim_customers
-        (customer_id, full_name, email, city, state, country, age_group,
-         registration_date, effective_date, end_date, is_current)
+# -------------------------------------------------
+# SCD TYPE 2 DIMENSIONS
+# -------------------------------------------------
+# Tracked attributes per dimension as (dimension column, production
+# expression). attribute_hash is the md5 of a version's tracked values: a
+# row whose hash changed gets its current version closed and a new one
+# inserted, everything else is left as it is.
+#
+# A version is valid from effective_date up to (not including) end_date, and
+# facts take the version valid on their transaction date. A key's first
+# version starts at SCD2_START_DATE so that it covers all earlier history.
+SCD2_START_DATE = "1900-01-01"
+SCD2_DIMENSIONS = {
+    "dim_customers": {
+        "natural_key": "customer_id",
+        "source": "production.customers",
+        "attributes": [
+            ("full_name", "first_name || ' ' || last_name"),
+            ("email", "email"),
+            ("city", "city"),
+            ("state", "state"),
+            ("country", "country"),
+            ("age_group", "age_group"),
+            ("registration_date", "registration_date"),
+        ],
+    },
+    "dim_products": {
+        "natural_key": "product_id",
+        "source": "production.products",
+        "attributes": [
+            ("product_name", "product_name"),
+            ("category", "category"),
+            ("sub_category", "sub_category"),
+            ("brand", "brand"),
+            ("price_range", "price_category"),
+        ],
+    },
+}
+
+
+def attribute_hash(expressions: list) -> str:
+    # The row's text form keeps NULL and '' apart, unlike concat_ws
+    return f"md5(CAST(ROW({', '.join(expressions)}) AS TEXT))"
+
+
+def load_scd2_dimension(conn, table, schema="warehouse") -> dict:
+    spec = SCD2_DIMENSIONS[table]
+    key = spec["natural_key"]
+    columns = [column for column, _ in spec["attributes"]]
+    expressions = [expression for _, expression in spec["attributes"]]
+
+    # Versions written before attribute_hash existed, one per key
+    conn.execute(text(f"""
+        UPDATE {schema}.{table}
+        SET attribute_hash = {attribute_hash(columns)}, effective_date = :start_date
+        WHERE attribute_hash IS NULL
+    """), {"start_date": SCD2_START_DATE})
+
+    conn.execute(text(f"""
+        CREATE TEMP TABLE scd_source ON COMMIT DROP AS
         SELECT
-            customer_id,
-            first_name || ' ' || last_name,
-            email,
-            city,
-            state,
-            country,
-            age_group,
-            registration_date,
-            CURRENT_DATE,
-            NULL,
-            TRUE
-        FROM production.customers;
+            {key},
+            {", ".join(f"{e} AS {c}" for c, e in spec["attributes"])},
+            {attribute_hash(expressions)} AS attribute_hash
+        FROM {spec["source"]}
     """))
-    print("dim_customers loaded")
 
+    closed = conn.execute(text(f"""
+        UPDATE {schema}.{table} d
+        SET end_date = CURRENT_DATE, is_current = FALSE
+        FROM scd_source s
+        WHERE d.{key} = s.{key}
+          AND d.is_current = TRUE
+          AND d.attribute_hash <> s.attribute_hash
+    """)).rowcount
 
-def load_dim_products(conn):
-    conn.execute(text("""
-        INSERT INTO warehouse.dim_products
-        (product_id, product_name, category, sub_category, brand,
-         price_range, effective_date, end_date, is_current)
+    inserted = conn.execute(text(f"""
+        INSERT INTO {schema}.{table}
+        ({key}, {", ".join(columns)}, attribute_hash, effective_date, end_date, is_current)
         SELECT
-            product_id,
-            product_name,
-            category,
-            sub_category,
-            brand,
-            price_category,
-            CURRENT_DATE,
-            NULL,
-            TRUE
-        FROM production.products;
-    """))
-    print("dim_products loaded")
+            {key}, {", ".join(columns)}, attribute_hash,
+            CASE
+                WHEN EXISTS (SELECT 1 FROM {schema}.{table} d WHERE d.{key} = s.{key})
+                THEN CURRENT_DATE
+                ELSE CAST(:start_date AS DATE)
+            END,
+            NULL, TRUE
+        FROM scd_source s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {schema}.{table} d
+            WHERE d.{key} = s.{key} AND d.is_current = TRUE
+        )
+    """), {"start_date": SCD2_START_DATE}).rowcount
+    conn.execute(text("DROP TABLE scd_source"))
 
+    stats = {"new": inserted - closed, "changed": closed}
+    print(f"{table} loaded: {stats['new']} new, {stats['changed']} new versions")
+    return stats
 
-def load_fact_sales(conn):
-    conn.execute(text("""
-        INSERT INTO warehouse.fact_sales
+
+def load_dim_customers(conn, schema="warehouse"):
+    return load_scd2_dimension(conn, "dim_customers", schema)
+
+
+def load_dim_products(conn, schema="warehouse"):
+    return load_scd2_dimension(conn, "dim_products", schema)
+
+
+def load_fact_sales(conn, schema="warehouse", date_keys=None, cutoff=None):
+    # date_keys limits the load to those days (incremental runs); days
+    # before the retention cutoff have no partition to go to
+    filters = []
+    if date_keys is not None:
+        filters.append("dd.date_key = ANY(:date_keys)")
+    if cutoff is not None:
+        filters.append("dd.date_key >= :cutoff")
+    date_filter = "WHERE " + " AND ".join(filters) if filters else ""
+    result = conn.execute(text(f"""
+        INSERT INTO {schema}.fact_sales
         (date_key, customer_key, product_key, payment_method_key,
          transaction_id, quantity, unit_price, discount_amount,
          line_total, profit, created_at)
@@ -152,39 +334,365 @@ def load_fact_sales(conn):
         FROM production.transaction_items ti
         JOIN production.transactions t ON ti.transaction_id = t.transaction_id
         JOIN production.products p ON ti.product_id = p.product_id
-        JOIN warehouse.dim_date dd
+        JOIN {schema}.dim_date dd
         ON dd.date_key = CAST(TO_CHAR(t.transaction_date, 'YYYYMMDD') AS INTEGER)
-        JOIN warehouse.dim_customers dc ON dc.customer_id = t.customer_id AND dc.is_current = TRUE
-        JOIN warehouse.dim_products dp ON dp.product_id = ti.product_id AND dp.is_current = TRUE
-        JOIN warehouse.dim_payment_method dpm ON dpm.payment_method_name = t.payment_method;
-    """))
-    print(" fact_sales loaded")
+        JOIN {schema}.dim_customers dc
+        ON dc.customer_id = t.customer_id
+            AND t.transaction_date >= dc.effective_date
+            AND (dc.end_date IS NULL OR t.transaction_date < dc.end_date)
+        JOIN {schema}.dim_products dp
+        ON dp.product_id = ti.product_id
+            AND t.transaction_date >= dp.effective_date
+            AND (dp.end_date IS NULL OR t.transaction_date < dp.end_date)
+        JOIN {schema}.dim_payment_method dpm ON dpm.payment_method_name = t.payment_method
+        {date_filter};
+    """), {"date_keys": date_keys, "cutoff": cutoff})
+    print(f" fact_sales loaded: {result.rowcount} rows")
+    return result.rowcount
 
 
-def load_aggregates(conn):
-    conn.execute(text("""
-        INSERT INTO warehouse.agg_daily_sales
+def load_aggregates(conn, schema="warehouse", date_keys=None):
+    # With date_keys only agg_daily_sales is rebuilt, for those days; the
+    # product and customer aggregates then follow from merge_aggregate_delta
+    date_filter = "WHERE date_key = ANY(:date_keys)" if date_keys is not None else ""
+    conn.execute(text(f"""
+        INSERT INTO {schema}.agg_daily_sales
         SELECT
             date_key,
             COUNT(DISTINCT transaction_id),
             SUM(line_total),
             SUM(profit),
             COUNT(DISTINCT customer_key)
-        FROM warehouse.fact_sales
+        FROM {schema}.fact_sales
+        {date_filter}
         GROUP BY date_key;
-    """))
+    """), {"date_keys": date_keys})
+
+    if date_keys is None:
+        load_key_aggregates(conn, schema)
     print("aggregate tables loaded")
 
 
+def load_key_aggregates(conn, schema="warehouse"):
+    # Full rebuild of the per-product and per-customer aggregates
+    conn.execute(text(f"DELETE FROM {schema}.agg_product_performance"))
+    conn.execute(text(f"DELETE FROM {schema}.agg_customer_metrics"))
+    conn.execute(text(f"""
+        INSERT INTO {schema}.agg_product_performance
+        (product_key, total_quantity_sold, total_revenue, total_profit,
+         avg_discount_percentage, sales_line_count, total_unit_price,
+         total_discount_percentage)
+        SELECT
+            product_key,
+            SUM(quantity),
+            SUM(line_total),
+            SUM(profit),
+            SUM(discount_pct) / COUNT(*),
+            COUNT(*),
+            SUM(unit_price),
+            SUM(discount_pct)
+        FROM (
+            SELECT *, discount_amount / NULLIF(unit_price * quantity, 0) * 100 AS discount_pct
+            FROM {schema}.fact_sales
+        ) fs
+        GROUP BY product_key;
+    """))
+    conn.execute(text(f"""
+        INSERT INTO {schema}.agg_customer_metrics
+        (customer_key, total_transactions, total_spent, avg_order_value,
+         last_purchase_date, sales_line_count)
+        SELECT
+            fs.customer_key,
+            COUNT(DISTINCT fs.transaction_id),
+            SUM(fs.line_total),
+            SUM(fs.line_total) / COUNT(DISTINCT fs.transaction_id),
+            MAX(dd.full_date),
+            COUNT(*)
+        FROM {schema}.fact_sales fs
+        JOIN {schema}.dim_date dd ON dd.date_key = fs.date_key
+        GROUP BY fs.customer_key;
+    """))
+
+
+# -------------------------------------------------
+# AGGREGATE MAINTENANCE FROM FACT DELTAS
+# -------------------------------------------------
+# Incremental runs stage the fact rows of the touched days twice into a
+# temp table: once with sign -1 before they are deleted, once with +1 after
+# the reload. Every product/customer measure is a sum (averages are kept as
+# sum + count), so applying the signed rows brings the aggregates up to date
+# without touching the rest of fact_sales. A transaction's lines share one
+# day, so they are always staged together and distinct transaction counts
+# add up too.
+def stage_fact_delta(conn, date_keys, sign: int):
+    conn.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS fact_delta ON COMMIT DROP AS
+        SELECT CAST(0 AS SMALLINT) AS sign, * FROM warehouse.fact_sales WITH NO DATA
+    """))
+    conn.execute(text("""
+        INSERT INTO fact_delta
+        SELECT :sign, * FROM warehouse.fact_sales WHERE date_key = ANY(:date_keys)
+    """), {"sign": sign, "date_keys": date_keys})
+
+
+def merge_aggregate_delta(conn, date_keys):
+    conn.execute(text("""
+        INSERT INTO warehouse.agg_product_performance AS a
+        (product_key, total_quantity_sold, total_revenue, total_profit,
+         avg_discount_percentage, sales_line_count, total_unit_price,
+         total_discount_percentage)
+        SELECT
+            product_key,
+            SUM(sign * quantity),
+            SUM(sign * line_total),
+            SUM(sign * profit),
+            SUM(sign * discount_pct) / NULLIF(SUM(sign), 0),
+            SUM(sign),
+            SUM(sign * unit_price),
+            SUM(sign * discount_pct)
+        FROM (
+            SELECT *, discount_amount / NULLIF(unit_price * quantity, 0) * 100 AS discount_pct
+            FROM fact_delta
+        ) d
+        GROUP BY product_key
+        ON CONFLICT (product_key) DO UPDATE SET
+            total_quantity_sold = a.total_quantity_sold + EXCLUDED.total_quantity_sold,
+            total_revenue = a.total_revenue + EXCLUDED.total_revenue,
+            total_profit = a.total_profit + EXCLUDED.total_profit,
+            avg_discount_percentage = (
+                a.total_discount_percentage + EXCLUDED.total_discount_percentage
+            ) / NULLIF(a.sales_line_count + EXCLUDED.sales_line_count, 0),
+            sales_line_count = a.sales_line_count + EXCLUDED.sales_line_count,
+            total_unit_price = a.total_unit_price + EXCLUDED.total_unit_price,
+            total_discount_percentage =
+                a.total_discount_percentage + EXCLUDED.total_discount_percentage
+    """))
+
+    # last_purchase_date is a MAX, not a sum: it only has to be looked up
+    # again when the customer's latest day was reloaded and came back with
+    # nothing as recent (set to NULL here, filled below).
+    conn.execute(text("""
+        INSERT INTO warehouse.agg_customer_metrics AS a
+        (customer_key, total_transactions, total_spent, avg_order_value,
+         last_purchase_date, sales_line_count)
+        SELECT
+            d.customer_key,
+            COUNT(DISTINCT d.transaction_id) FILTER (WHERE d.sign = 1)
+                - COUNT(DISTINCT d.transaction_id) FILTER (WHERE d.sign = -1),
+            SUM(d.sign * d.line_total),
+            SUM(d.sign * d.line_total) / NULLIF(
+                COUNT(DISTINCT d.transaction_id) FILTER (WHERE d.sign = 1)
+                - COUNT(DISTINCT d.transaction_id) FILTER (WHERE d.sign = -1), 0),
+            MAX(dd.full_date) FILTER (WHERE d.sign = 1),
+            SUM(d.sign)
+        FROM fact_delta d
+        JOIN warehouse.dim_date dd ON dd.date_key = d.date_key
+        GROUP BY d.customer_key
+        ON CONFLICT (customer_key) DO UPDATE SET
+            total_transactions = a.total_transactions + EXCLUDED.total_transactions,
+            total_spent = a.total_spent + EXCLUDED.total_spent,
+            avg_order_value = (a.total_spent + EXCLUDED.total_spent)
+                / NULLIF(a.total_transactions + EXCLUDED.total_transactions, 0),
+            last_purchase_date = CASE
+                WHEN CAST(TO_CHAR(a.last_purchase_date, 'YYYYMMDD') AS INTEGER) <> ALL(:date_keys)
+                    THEN GREATEST(a.last_purchase_date, EXCLUDED.last_purchase_date)
+                WHEN EXCLUDED.last_purchase_date >= a.last_purchase_date
+                    THEN EXCLUDED.last_purchase_date
+            END,
+            sales_line_count = a.sales_line_count + EXCLUDED.sales_line_count
+    """), {"date_keys": date_keys})
+
+    # Keys whose last fact rows went away
+    conn.execute(text("DELETE FROM warehouse.agg_product_performance WHERE sales_line_count = 0"))
+    conn.execute(text("DELETE FROM warehouse.agg_customer_metrics WHERE sales_line_count = 0"))
+
+    conn.execute(text("""
+        UPDATE warehouse.agg_customer_metrics a
+        SET last_purchase_date = (
+            SELECT MAX(dd.full_date)
+            FROM warehouse.fact_sales fs
+            JOIN warehouse.dim_date dd ON dd.date_key = fs.date_key
+            WHERE fs.customer_key = a.customer_key
+        )
+        WHERE a.last_purchase_date IS NULL
+    """))
+    conn.execute(text("DROP TABLE fact_delta"))
+    print("aggregate deltas merged")
+
+
+# -------------------------------------------------
+# INCREMENTAL LOAD BY TOUCHED DAYS
+# -------------------------------------------------
+def ensure_load_state(conn):
+    # Same definition as the warehouse DDL, for databases created before it
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS warehouse.load_state (
+            table_name VARCHAR(50) PRIMARY KEY,
+            watermark TIMESTAMP,
+            rows_loaded BIGINT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def get_load_state(conn) -> dict:
+    rows = conn.execute(text("SELECT table_name, watermark FROM warehouse.load_state"))
+    return {row.table_name: row.watermark for row in rows}
+
+
+def save_load_state(conn, table_name: str, watermark, rows_loaded: int, schema="warehouse"):
+    conn.execute(text(f"""
+        INSERT INTO {schema}.load_state (table_name, watermark, rows_loaded, updated_at)
+        VALUES (:table_name, :watermark, :rows_loaded, CURRENT_TIMESTAMP)
+        ON CONFLICT (table_name) DO UPDATE SET
+            watermark = EXCLUDED.watermark,
+            rows_loaded = EXCLUDED.rows_loaded,
+            updated_at = EXCLUDED.updated_at
+    """), {"table_name": table_name, "watermark": watermark, "rows_loaded": rows_loaded})
+
+
+def production_high_water(conn):
+    return conn.execute(text("""
+        SELECT GREATEST(
+            (SELECT MAX(updated_at) FROM production.transactions),
+            (SELECT MAX(updated_at) FROM production.transaction_items)
+        )
+    """)).scalar()
+
+
+def touched_date_keys(conn, low, high) -> list:
+    # Production bumps updated_at only on rows whose values changed. A
+    # transaction counts as touched if it or any of its items changed in
+    # (low, high]; both its current day and any day it was previously
+    # loaded under (the date itself may have changed) are reloaded.
+    return conn.execute(text("""
+        WITH changed AS (
+            SELECT transaction_id FROM production.transactions
+            WHERE updated_at > :low AND updated_at <= :high
+            UNION
+            SELECT transaction_id FROM production.transaction_items
+            WHERE updated_at > :low AND updated_at <= :high
+        )
+        SELECT CAST(TO_CHAR(t.transaction_date, 'YYYYMMDD') AS INTEGER)
+        FROM production.transactions t
+        JOIN changed USING (transaction_id)
+        UNION
+        SELECT fs.date_key
+        FROM warehouse.fact_sales fs
+        JOIN changed USING (transaction_id)
+        ORDER BY 1
+    """), {"low": low, "high": high}).scalars().all()
+
+
+def delete_days(conn, date_keys=None):
+    # No date_keys means every day: the first incremental run rebuilds all
+    date_filter = "WHERE date_key = ANY(:date_keys)" if date_keys is not None else ""
+    for table in ("fact_sales", "agg_daily_sales"):
+        conn.execute(text(f"DELETE FROM warehouse.{table} {date_filter}"), {"date_keys": date_keys})
+
+
+def running_sums_missing(conn) -> bool:
+    return conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM warehouse.agg_product_performance WHERE sales_line_count IS NULL
+        ) OR EXISTS (
+            SELECT 1 FROM warehouse.agg_customer_metrics WHERE sales_line_count IS NULL
+        )
+    """)).scalar()
+
+
+def load_incremental(conn, cutoff=None) -> int:
+    watermark = get_load_state(conn).get("fact_sales")
+    high = production_high_water(conn)
+
+    load_dim_date(conn, cutoff=cutoff)
+    load_dim_payment_method(conn)
+    load_dim_customers(conn)
+    load_dim_products(conn)
+
+    date_keys = None
+    if watermark is not None:
+        date_keys = [key for key in touched_date_keys(conn, watermark, high)
+                     if cutoff is None or key >= cutoff]
+        print(f"fact_sales: {len(date_keys)} days touched since {watermark}")
+        if not date_keys:
+            save_load_state(conn, "fact_sales", high, 0)
+            return 0
+
+    # Aggregates written before the running-sum columns existed cannot take
+    # a delta; they are rebuilt once instead
+    merge = date_keys is not None and not running_sums_missing(conn)
+    if merge:
+        stage_fact_delta(conn, date_keys, -1)
+    delete_days(conn, date_keys)
+    rows = load_fact_sales(conn, date_keys=date_keys, cutoff=cutoff)
+    load_aggregates(conn, date_keys=date_keys)
+    if merge:
+        stage_fact_delta(conn, date_keys, 1)
+        merge_aggregate_delta(conn, date_keys)
+    elif date_keys is not None:
+        load_key_aggregates(conn)
+    save_load_state(conn, "fact_sales", high, rows)
+    return rows
+
+
 if __name__ == "__main__":
+    incremental = LOAD_STRATEGY == "incremental"
+
+    # With pipeline.shadow_swap the load goes into warehouse_next and readers
+    # keep querying the live warehouse until the final rename. Incremental
+    # runs are small and always work in place.
+    use_shadow = SHADOW_SWAP and not incremental
+    target = shadow_name("warehouse") if use_shadow else "warehouse"
+
+    # DETACH/DROP PARTITION locks fact_sales against readers, so retention
+    # runs in short transactions of its own rather than inside the load. In
+    # place it goes first, before a full load could truncate the old months.
     with engine.begin() as conn:
-        truncate_warehouse_tables(conn)
-
-        load_dim_date(conn)
-        load_dim_payment_method(conn)
-        load_dim_customers(conn)
-        load_dim_products(conn)
-        load_fact_sales(conn)
-        load_aggregates(conn)
+        ensure_load_state(conn)
+        cutoff = retention_cutoff(conn)
+        retired = [] if use_shadow else retire_fact_partitions(conn, cutoff, RETENTION_ACTION)
+
+    with engine.begin() as conn:
+        if incremental:
+            load_incremental(conn, cutoff)
+            # Retired months leave no fact rows to diff against
+            if retired:
+                load_key_aggregates(conn)
+        else:
+            if use_shadow:
+                deferred_ddl = create_shadow_schema(conn, "warehouse", copy_tables=DIMENSION_TABLES)
+            else:
+                truncate_warehouse_tables(conn)
+
+            # fact_sales FKs are checked once after the load instead of per row
+            defer = DEFERRED_INDEXES and not use_shadow
+            high = production_high_water(conn)
+            deferred = (
+                deferred_indexes(conn, "warehouse", **INDEX_BUILD_OPTIONS)
+                if defer else nullcontext()
+            )
+            with deferred:
+                load_dim_date(conn, target, cutoff)
+                load_dim_payment_method(conn, target)
+                load_dim_customers(conn, target)
+                load_dim_products(conn, target)
+                rows = load_fact_sales(conn, target, cutoff=cutoff)
+                load_aggregates(conn, target)
+
+            if use_shadow:
+                build_indexes(conn, deferred_ddl, **INDEX_BUILD_OPTIONS)
+            # A later incremental run picks up from this load
+            save_load_state(conn, "fact_sales", high, rows, schema=target)
+            if use_shadow:
+                swap_schema(conn, "warehouse")
+
+    if use_shadow:
+        # The shadow was built without the expired months; they are archived
+        # from the schema the swap just retired, which no new query reads
+        with engine.begin() as conn:
+            retire_fact_partitions(conn, cutoff, RETENTION_ACTION,
+                                   schema=f"warehouse{RETIRED_SUFFIX}")
+            drop_retired_schema(conn, "warehouse")
 
     print("\n PHASE 3.3 WAREHOUSE LOAD COMPLETED SUCCESSFULLY")
@@ -0,0 +1,236 @@
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+
+# -------------------------------------------------
+# SHADOW SCHEMA BUILD + ATOMIC SWAP
+# -------------------------------------------------
+# A full load builds into <schema>_next while readers keep using <schema>.
+# Tables are cloned without indexes or key constraints so the bulk insert
+# stays cheap; those are replayed from the live catalog after the load, and
+# the schemas are then swapped with two renames.
+SHADOW_SUFFIX = "_next"
+RETIRED_SUFFIX = "_old"
+
+
+def shadow_name(schema: str) -> str:
+    return f"{schema}{SHADOW_SUFFIX}"
+
+
+def list_tables(connection, schema: str) -> list:
+    return connection.execute(text("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema
+          AND c.relkind IN ('r', 'p')
+          AND NOT c.relispartition
+        ORDER BY c.relname
+    """), {"schema": schema}).scalars().all()
+
+
+def partition_key(connection, schema: str, table: str):
+    # e.g. "RANGE (date_key)" for a partitioned table, None otherwise
+    return connection.execute(text("""
+        SELECT pg_get_partkeydef(c.oid)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relname = :table
+    """), {"schema": schema, "table": table}).scalar()
+
+
+def list_serial_columns(connection, schema: str) -> list:
+    # SERIAL columns own their sequence with an 'a' (auto) dependency
+    return connection.execute(text("""
+        SELECT t.relname AS table_name, a.attname AS column_name,
+               s.relname AS sequence_name, format_type(q.seqtypid, NULL) AS sequence_type
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_sequence q ON q.seqrelid = s.oid
+        JOIN pg_class t ON t.oid = d.refobjid
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = d.refobjsubid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = :schema AND d.deptype = 'a'
+    """), {"schema": schema}).fetchall()
+
+
+def constraint_definitions(connection, schema: str) -> list:
+    # Qualify every name in the generated definitions so they can be
+    # retargeted at another schema with a plain prefix replace.
+    connection.execute(text("SET LOCAL search_path TO pg_catalog"))
+    rows = connection.execute(text("""
+        SELECT c.relname AS table_name, con.conname, con.contype,
+               pg_get_constraintdef(con.oid) AS definition
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema
+          AND con.contype IN ('p', 'u', 'x', 'f')
+          AND con.conparentid = 0
+          AND NOT c.relispartition
+        ORDER BY c.relname, con.conname
+    """), {"schema": schema}).fetchall()
+    connection.execute(text("SET LOCAL search_path TO DEFAULT"))
+    return rows
+
+
+def index_definitions(connection, schema: str) -> list:
+    # Secondary indexes only; those backing PK/UNIQUE constraints come and
+    # go with the constraint.
+    connection.execute(text("SET LOCAL search_path TO pg_catalog"))
+    rows = connection.execute(text("""
+        SELECT c.relname AS table_name, i.relname AS index_name,
+               pg_get_indexdef(i.oid) AS definition
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class c ON c.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema
+          AND NOT c.relispartition
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint con
+              WHERE con.conindid = i.oid AND con.contype IN ('p', 'u', 'x')
+          )
+        ORDER BY i.relname
+    """), {"schema": schema}).fetchall()
+    connection.execute(text("SET LOCAL search_path TO DEFAULT"))
+    return rows
+
+
+def index_ddl(row, schema: str, target: str) -> tuple:
+    # Indexes on partitioned tables are reported as ON ONLY; rebuild them
+    # across all partitions.
+    definition = row.definition.replace(f" ON ONLY {schema}.", f" ON {schema}.", 1)
+    return row.index_name, definition.replace(f" ON {schema}.", f" ON {target}.", 1)
+
+
+def foreign_key_ddl(row, schema: str, target: str) -> tuple:
+    # Rebuilt inside the load transaction, which keeps the ADD lock until
+    # commit anyway, so NOT VALID + VALIDATE would gain nothing here.
+    definition = row.definition.replace(f"REFERENCES {schema}.", f"REFERENCES {target}.", 1)
+    return row.conname, (
+        f"ALTER TABLE {target}.{row.table_name} ADD CONSTRAINT {row.conname} {definition}"
+    )
+
+
+def deferred_ddl(connection, schema: str, shadow: str) -> list:
+    constraints = constraint_definitions(connection, schema)
+
+    # Key constraints first so foreign keys have something to reference
+    ddl = []
+    for row in constraints:
+        if row.contype != "f":
+            ddl.append((row.conname, (
+                f"ALTER TABLE {shadow}.{row.table_name} "
+                f"ADD CONSTRAINT {row.conname} {row.definition}"
+            )))
+    for row in index_definitions(connection, schema):
+        ddl.append(index_ddl(row, schema, shadow))
+    for row in constraints:
+        if row.contype == "f":
+            ddl.append(foreign_key_ddl(row, schema, shadow))
+    return ddl
+
+
+def create_shadow_schema(connection, schema: str, copy_tables: tuple = ()) -> list:
+    shadow = shadow_name(schema)
+
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {shadow} CASCADE"))
+    connection.execute(text(f"CREATE SCHEMA {shadow}"))
+
+    # Column definitions, defaults and CHECK constraints only; keys and
+    # indexes come back in build_indexes once the data is in. LIKE does not
+    # carry partitioning, so partitioned tables get their key re-declared;
+    # the loader creates the partitions it needs.
+    for table in list_tables(connection, schema):
+        partition_by = partition_key(connection, schema, table)
+        connection.execute(text(
+            f"CREATE TABLE {shadow}.{table} (LIKE {schema}.{table} "
+            f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED "
+            f"INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS)"
+            + (f" PARTITION BY {partition_by}" if partition_by else "")
+        ))
+
+    # LIKE copies nextval() defaults that still point at the live schema's
+    # sequences, which are dropped with it. Give the shadow its own, picking
+    # up where the live ones left off so surrogate keys keep increasing.
+    for row in list_serial_columns(connection, schema):
+        sequence = f"{shadow}.{row.sequence_name}"
+        connection.execute(text(
+            f"CREATE SEQUENCE {sequence} AS {row.sequence_type} "
+            f"OWNED BY {shadow}.{row.table_name}.{row.column_name}"
+        ))
+        connection.execute(text(
+            f"SELECT setval('{sequence}', last_value, is_called) "
+            f"FROM {schema}.{row.sequence_name}"
+        ))
+        connection.execute(text(
+            f"ALTER TABLE {shadow}.{row.table_name} "
+            f"ALTER COLUMN {row.column_name} SET DEFAULT nextval('{sequence}')"
+        ))
+
+    for table in copy_tables:
+        connection.execute(text(f"INSERT INTO {shadow}.{table} SELECT * FROM {schema}.{table}"))
+
+    print(f"Shadow schema {shadow} created")
+    return deferred_ddl(connection, schema, shadow)
+
+
+def build_indexes(connection, ddl: list, maintenance_workers: int = 2,
+                  maintenance_work_mem: str = "256MB"):
+    # Btree builds use parallel workers when the table is large enough
+    connection.execute(text(
+        f"SET LOCAL max_parallel_maintenance_workers = {int(maintenance_workers)}"
+    ))
+    connection.execute(text(f"SET LOCAL maintenance_work_mem = '{maintenance_work_mem}'"))
+
+    total_start = time.time()
+    for name, statement in ddl:
+        start_time = time.time()
+        connection.execute(text(statement))
+        print(f"  built {name} in {time.time() - start_time:.2f}s")
+    print(f"  {len(ddl)} index/constraint builds in {time.time() - total_start:.2f}s")
+
+
+# -------------------------------------------------
+# DEFERRED INDEXES FOR IN-PLACE BULK LOADS
+# -------------------------------------------------
+@contextmanager
+def deferred_indexes(connection, schema: str, **build_options):
+    # Drops secondary indexes and foreign keys for the duration of a full
+    # reload and rebuilds them once afterwards. PK/UNIQUE constraints stay,
+    # since loads rely on them for ON CONFLICT. On error the surrounding
+    # transaction rolls back and the drops are undone with it.
+    foreign_keys = [row for row in constraint_definitions(connection, schema) if row.contype == "f"]
+    indexes = index_definitions(connection, schema)
+
+    for row in foreign_keys:
+        connection.execute(text(
+            f"ALTER TABLE {schema}.{row.table_name} DROP CONSTRAINT {row.conname}"
+        ))
+    for row in indexes:
+        connection.execute(text(f"DROP INDEX {schema}.{row.index_name}"))
+    print(f"Deferred {len(indexes)} indexes and {len(foreign_keys)} foreign keys on {schema}")
+
+    yield
+
+    ddl = [index_ddl(row, schema, schema) for row in indexes]
+    for row in foreign_keys:
+        ddl.append(foreign_key_ddl(row, schema, schema))
+    build_indexes(connection, ddl, **build_options)
+
+
+def swap_schema(connection, schema: str):
+    # Only the two renames need to happen atomically; readers resolve the
+    # new schema by name as soon as this transaction commits.
+    retired = f"{schema}{RETIRED_SUFFIX}"
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {retired} CASCADE"))
+    connection.execute(text(f"ALTER SCHEMA {schema} RENAME TO {retired}"))
+    connection.execute(text(f"ALTER SCHEMA {shadow_name(schema)} RENAME TO {schema}"))
+    print(f"Schema {shadow_name(schema)} swapped in as {schema}")
+
+
+def drop_retired_schema(connection, schema: str):
+    # Run after the swap has committed, so queries still finishing against
+    # the old tables never hold up the swap itself.
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {schema}{RETIRED_SUFFIX} CASCADE"))
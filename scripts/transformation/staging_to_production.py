@@ -1,10 +1,29 @@
 import pandas as pd
+import numpy as np
+import io
 import json
+import operator
 import os
+import sys
+import time
 import yaml
+from contextlib import nullcontext
 from datetime import datetime
+from functools import lru_cache
 from sqlalchemy import create_engine, text
 
+from schema_management import (
+    build_indexes,
+    create_shadow_schema,
+    deferred_indexes,
+    drop_retired_schema,
+    shadow_name,
+    swap_schema,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import schema_registry  # noqa: E402
+
 # -------------------------------------------------
 # LOAD CONFIG
 # -------------------------------------------------
@@ -29,20 +48,176 @@ engine = create_engine(ENGINE_URL)
 OUTPUT_PATH = "data/processed"
 os.makedirs(OUTPUT_PATH, exist_ok=True)
 
+TRANSFORM_CFG = config.get("transformation", {})
+TRANSFORM_MODE = TRANSFORM_CFG.get("mode", "pandas")
+CHUNK_SIZE = TRANSFORM_CFG.get("chunk_size", 50000)
+LOAD_METHOD = config.get("pipeline", {}).get("load_method", "copy")
+SHADOW_SWAP = config.get("pipeline", {}).get("shadow_swap", False)
+DEFERRED_INDEXES = config.get("pipeline", {}).get("deferred_indexes", False)
+INDEX_BUILD_OPTIONS = {
+    "maintenance_workers": config.get("pipeline", {}).get("maintenance_workers", 2),
+    "maintenance_work_mem": config.get("pipeline", {}).get("maintenance_work_mem", "256MB"),
+}
+LOAD_STRATEGY = TRANSFORM_CFG.get("load_strategy", "full")
+NORMALIZE_CACHE_SIZE = TRANSFORM_CFG.get("normalize_cache_size", 100000)
+# The filters the load has always applied, for configs without a
+# business_rules block
+DEFAULT_BUSINESS_RULES = {
+    "products": [
+        {"name": "positive_price", "column": "price", "op": ">", "value": 0},
+        {"name": "non_negative_cost", "column": "cost", "op": ">=", "value": 0},
+    ],
+    "transactions": [
+        {"name": "positive_total_amount", "column": "total_amount", "op": ">", "value": 0},
+    ],
+    "transaction_items": [
+        {"name": "positive_quantity", "column": "quantity", "op": ">", "value": 0},
+    ],
+}
+BUSINESS_RULES = config.get("business_rules", DEFAULT_BUSINESS_RULES)
+
+TABLE_ORDER = ["customers", "products", "transactions", "transaction_items"]
+
+# READ FROM STAGING (NO loaded_at SELECTED)
+STAGING_QUERIES = {
+    "customers": """
+        SELECT customer_id, first_name, last_name, email, phone,
+               registration_date, city, state, country, age_group
+        FROM staging.customers
+    """,
+    "products": """
+        SELECT product_id, product_name, category, sub_category,
+               price, cost, brand, stock_quantity, supplier_id
+        FROM staging.products
+    """,
+    "transactions": """
+        SELECT transaction_id, customer_id, transaction_date,
+               transaction_time, payment_method, shipping_address,
+               total_amount
+        FROM staging.transactions
+    """,
+    "transaction_items": """
+        SELECT item_id, transaction_id, product_id,
+               quantity, unit_price, discount_percentage, line_total
+        FROM staging.transaction_items
+    """,
+}
+
+PRODUCTION_COLUMNS = {
+    "customers": [
+        "customer_id",
+        "first_name",
+        "last_name",
+        "email",
+        "phone",
+        "registration_date",
+        "city",
+        "state",
+        "country",
+        "age_group",
+    ],
+    "products": [
+        "product_id",
+        "product_name",
+        "category",
+        "sub_category",
+        "price",
+        "cost",
+        "brand",
+        "stock_quantity",
+        "supplier_id",
+        "profit_margin",
+        "price_category",
+    ],
+    "transactions": [
+        "transaction_id",
+        "customer_id",
+        "transaction_date",
+        "transaction_time",
+        "payment_method",
+        "shipping_address",
+        "total_amount",
+    ],
+    "transaction_items": [
+        "item_id",
+        "transaction_id",
+        "product_id",
+        "quantity",
+        "unit_price",
+        "discount_percentage",
+        "line_total",
+    ],
+}
+
+PRIMARY_KEYS = {
+    "customers": "customer_id",
+    "products": "product_id",
+    "transactions": "transaction_id",
+    "transaction_items": "item_id",
+}
+
+
+# -------------------------------------------------
+# TEXT NORMALIZATION (DISTINCT VALUES ONLY)
+# -------------------------------------------------
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(value: str, case: str) -> str:
+    value = value.strip()
+    return value.title() if case == "title" else value.lower()
+
+
+def normalize_text_column(series: pd.Series, case: str) -> pd.Series:
+    # Names repeat heavily, so strip/title/lower run once per distinct value
+    # (and the LRU cache carries them across chunks) instead of once per row.
+    # Same result as series.str.strip().str.<case>().
+    codes, uniques = pd.factorize(series)
+    normalized = np.array(
+        [normalize_text(v, case) if isinstance(v, str) else np.nan for v in uniques]
+        + [np.nan],  # code -1 (missing) takes this trailing slot
+        dtype=object
+    )
+    values = normalized.take(codes)
+
+    # Missing values pass through untouched (None stays None, NaN stays NaN)
+    missing = codes == -1
+    values[missing] = series.to_numpy(dtype=object)[missing]
+    result = pd.Series(values, index=series.index, name=series.name)
+
+    # Keep registry-typed columns in their compact dtype
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return result.astype("category")
+    if isinstance(series.dtype, pd.StringDtype):
+        return result.astype(series.dtype)
+    return result
+
+
+def fill_missing(series: pd.Series, value) -> pd.Series:
+    if not series.isna().any():
+        return series
+    # Categorical columns only accept fill values that are categories
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
 # -------------------------------------------------
 # CLEANSE FUNCTIONS
 # -------------------------------------------------
-def cleanse_customer_data(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df["first_name"] = df["first_name"].str.strip().str.title()
-    df["last_name"] = df["last_name"].str.strip().str.title()
-    df["email"] = df["email"].str.strip().str.lower()
-    df["phone"] = df["phone"].astype(str).str.replace(r"\D", "", regex=True)
+def cleanse_customer_data(df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+    if copy:
+        df = df.copy()
+    df["first_name"] = normalize_text_column(df["first_name"], "title")
+    df["last_name"] = normalize_text_column(df["last_name"], "title")
+    df["email"] = df["email"].str.strip().str.lower()  # near-unique, nothing to share
+    # A missing phone becomes "" (astype(str) on a pyarrow string would
+    # otherwise spell it "<NA>")
+    df["phone"] = df["phone"].fillna("").astype(str).str.replace(r"\D", "", regex=True)
     return df
 
 
-def cleanse_product_data(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+def cleanse_product_data(df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+    if copy:
+        df = df.copy()
 
     df["profit_margin"] = ((df["price"] - df["cost"]) / df["price"]) * 100
 
@@ -56,90 +231,245 @@ def cleanse_product_data(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def apply_business_rules(df: pd.DataFrame, rule_type: str) -> pd.DataFrame:
-    df = df.copy()
-    if rule_type == "transactions":
-        df = df[df["total_amount"] > 0]
-    if rule_type == "transaction_items":
-        df = df[df["quantity"] > 0]
-    return df
-
-
 # -------------------------------------------------
-# LOAD TO PRODUCTION (STRICT SCHEMA ALIGNMENT)
+# BUSINESS RULE ENGINE (config.yaml: business_rules)
 # -------------------------------------------------
-def load_to_production(df: pd.DataFrame, table_name: str, connection) -> dict:
-    df = df.copy()
-
+# Each rule is {name, column, op, value}; a row is kept only if it passes
+# every rule for its entity. The same rules compile to a pandas mask and to
+# the pushdown WHERE clause, so both modes reject the same rows.
+RULE_OPERATORS = {
+    ">": (operator.gt, ">"),
+    ">=": (operator.ge, ">="),
+    "<": (operator.lt, "<"),
+    "<=": (operator.le, "<="),
+    "==": (operator.eq, "="),
+    "!=": (operator.ne, "<>"),
+}
+
+# Per-table, per-rule rejection counts and evaluation time for the summary.
+# In pushdown mode all rules of a table are counted in one scan, so only that
+# scan is timed (RULE_SCAN_SECONDS) and the rules carry no time of their own.
+RULE_STATS = {}
+RULE_SCAN_SECONDS = {}
+
+
+def sql_literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def rule_mask(df: pd.DataFrame, rule: dict) -> pd.Series:
+    column = df[rule["column"]]
+    if rule["op"] == "not_null":
+        mask = column.notna()
+    elif rule["op"] == "in":
+        mask = column.isin(rule["value"])
+    else:
+        mask = RULE_OPERATORS[rule["op"]][0](column, rule["value"])
+    # NULLs fail a comparison, as they do in SQL
+    return mask.fillna(False).astype(bool)
+
+
+def rule_sql(rule: dict) -> str:
+    if rule["op"] == "not_null":
+        return f"{rule['column']} IS NOT NULL"
+    if rule["op"] == "in":
+        return f"{rule['column']} IN ({', '.join(sql_literal(v) for v in rule['value'])})"
+    return f"{rule['column']} {RULE_OPERATORS[rule['op']][1]} {sql_literal(rule['value'])}"
+
+
+def business_rule_where(table_name: str) -> str:
+    rules = BUSINESS_RULES.get(table_name, [])
+    if not rules:
+        return ""
+    return "WHERE " + "\n          AND ".join(rule_sql(rule) for rule in rules)
+
+
+def record_rule_stats(table_name: str, rule_name: str, rejected: int, seconds: float = None):
+    stats = RULE_STATS.setdefault(table_name, {}).setdefault(rule_name, {"rows_rejected": 0})
+    stats["rows_rejected"] += int(rejected)
+    if seconds is not None:
+        stats["seconds"] = round(stats.get("seconds", 0.0) + seconds, 6)
+
+
+def apply_business_rules(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    rules = BUSINESS_RULES.get(table_name, [])
+    if not rules:
+        return df
+
+    # Rules only build boolean masks; the frame is filtered (and copied)
+    # once with the combined mask.
+    keep = np.ones(len(df), dtype=bool)
+    for rule in rules:
+        start_time = time.time()
+        mask = rule_mask(df, rule).to_numpy()
+        keep &= mask
+        record_rule_stats(table_name, rule["name"], (~mask).sum(), time.time() - start_time)
+
+    return df[keep]
+
+
+def cleanse_table(df: pd.DataFrame, table_name: str, copy: bool = True) -> pd.DataFrame:
     if table_name == "customers":
-        df = df[
-            [
-                "customer_id",
-                "first_name",
-                "last_name",
-                "email",
-                "phone",
-                "registration_date",
-                "city",
-                "state",
-                "country",
-                "age_group",
-            ]
-        ]
+        return cleanse_customer_data(df, copy=copy)
+    if table_name == "products":
+        return enforce_product_quality(cleanse_product_data(df, copy=copy), copy=False)
+    return df
 
-    elif table_name == "products":
-        df = df[
-            [
-                "product_id",
-                "product_name",
-                "category",
-                "sub_category",
-                "price",
-                "cost",
-                "brand",
-                "stock_quantity",
-                "supplier_id",
-                "profit_margin",
-                "price_category",
-            ]
-        ]
 
-    elif table_name == "transactions":
-        df = df[
-            [
-                "transaction_id",
-                "customer_id",
-                "transaction_date",
-                "transaction_time",
-                "payment_method",
-                "shipping_address",
-                "total_amount",
-            ]
-        ]
+def transform_table(df: pd.DataFrame, table_name: str, copy: bool = True) -> pd.DataFrame:
+    return apply_business_rules(cleanse_table(df, table_name, copy=copy), table_name)
 
-    elif table_name == "transaction_items":
-        df = df[
-            [
-                "item_id",
-                "transaction_id",
-                "product_id",
-                "quantity",
-                "unit_price",
-                "discount_percentage",
-                "line_total",
-            ]
-        ]
 
-    df.to_sql(
-        table_name,
-        connection,
-        schema="production",
-        if_exists="append",
-        index=False,
-        method=None  # 🔥 disables multi-bind chaos
-    )
+# -------------------------------------------------
+# IN-DATABASE (PUSHDOWN) TRANSFORMS
+# Set-based equivalents of the pandas functions above, which stay the
+# reference implementation. Note INITCAP treats digits as part of a word
+# while str.title() does not; names never contain digits.
+# -------------------------------------------------
+PUSHDOWN_SELECTS = {
+    # cleanse_customer_data (a NULL phone becomes "")
+    "customers": """
+        SELECT
+            customer_id,
+            INITCAP(BTRIM(first_name, E' \\t\\n\\r')) AS first_name,
+            INITCAP(BTRIM(last_name, E' \\t\\n\\r')) AS last_name,
+            LOWER(BTRIM(email, E' \\t\\n\\r')) AS email,
+            COALESCE(REGEXP_REPLACE(phone, '\\D', '', 'g'), '') AS phone,
+            registration_date,
+            city,
+            state,
+            country,
+            age_group
+        FROM staging.customers
+    """,
+    # cleanse_product_data + enforce_product_quality (pd.cut leaves prices
+    # outside its bins as "nan")
+    "products": """
+        SELECT
+            product_id,
+            COALESCE(product_name, 'Unknown Product') AS product_name,
+            COALESCE(category, 'Unknown') AS category,
+            COALESCE(sub_category, 'Unknown') AS sub_category,
+            price,
+            cost,
+            COALESCE(brand, 'Unknown Brand') AS brand,
+            stock_quantity,
+            supplier_id,
+            ((price - cost) / price) * 100 AS profit_margin,
+            CASE
+                WHEN price >= 0 AND price <= 50 THEN 'Budget'
+                WHEN price > 50 AND price <= 200 THEN 'Mid-range'
+                WHEN price > 200 AND price <= 100000 THEN 'Premium'
+                ELSE 'nan'
+            END AS price_category
+        FROM staging.products
+    """,
+    "transactions": """
+        SELECT
+            transaction_id, customer_id, transaction_date, transaction_time,
+            payment_method, shipping_address, total_amount
+        FROM staging.transactions
+    """,
+    "transaction_items": """
+        SELECT
+            item_id, transaction_id, product_id, quantity,
+            unit_price, discount_percentage, line_total
+        FROM staging.transaction_items
+    """,
+}
+
+# apply_business_rules, compiled to a WHERE clause over the staging columns
+PUSHDOWN_QUERIES = {
+    table: f"{query.rstrip()}\n        {business_rule_where(table)}\n"
+    for table, query in PUSHDOWN_SELECTS.items()
+}
+
+
+def pushdown_rule_stats(table_name: str, connection):
+    # One scan counts the rejections of every rule
+    rules = BUSINESS_RULES.get(table_name, [])
+    if not rules:
+        return
+    start_time = time.time()
+    counts = connection.execute(text(
+        "SELECT " + ", ".join(
+            f"COUNT(*) FILTER (WHERE NOT COALESCE({rule_sql(rule)}, FALSE))" for rule in rules
+        ) + f" FROM staging.{table_name}"
+    )).fetchone()
+    RULE_SCAN_SECONDS[table_name] = round(time.time() - start_time, 6)
+    for rule, rejected in zip(rules, counts):
+        record_rule_stats(table_name, rule["name"], rejected)
+
+
+def load_pushdown(table_name: str, connection, schema: str = "production") -> dict:
+    pushdown_rule_stats(table_name, connection)
+    start_time = time.time()
+    columns = ", ".join(PRODUCTION_COLUMNS[table_name])
+    result = connection.execute(text(
+        f"INSERT INTO {schema}.{table_name} ({columns}) {PUSHDOWN_QUERIES[table_name]}"
+    ))
+    return {
+        "rows_loaded": result.rowcount,
+        "rows_per_second": rows_per_second(result.rowcount, time.time() - start_time)
+    }
 
-    return {"rows_loaded": len(df)}
+
+# -------------------------------------------------
+# LOAD TO PRODUCTION (STRICT SCHEMA ALIGNMENT)
+# -------------------------------------------------
+def rows_per_second(rows: int, elapsed: float) -> float:
+    return round(rows / elapsed, 2) if elapsed > 0 else None
+
+
+def copy_to_production(df: pd.DataFrame, table_name: str, connection,
+                       schema: str = "production") -> int:
+    # NULLs are written as \N so empty strings (e.g. a cleansed phone) stay
+    # empty strings instead of becoming NULL under CSV COPY rules.
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+
+    # COPY runs on the DBAPI connection behind the SQLAlchemy one, so it
+    # shares the surrounding transaction.
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {schema}.{table_name} ({', '.join(df.columns)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def load_to_production(df: pd.DataFrame, table_name: str, connection,
+                       schema: str = "production") -> dict:
+    start_time = time.time()
+
+    # Column projection builds a new frame; the input is never modified
+    if table_name in PRODUCTION_COLUMNS:
+        df = df[PRODUCTION_COLUMNS[table_name]]
+
+    if LOAD_METHOD == "copy":
+        rows_loaded = copy_to_production(df, table_name, connection, schema=schema)
+    else:
+        df.to_sql(
+            table_name,
+            connection,
+            schema=schema,
+            if_exists="append",
+            index=False,
+            method=None  # 🔥 disables multi-bind chaos
+        )
+        rows_loaded = len(df)
+
+    return {
+        "rows_loaded": rows_loaded,
+        "rows_per_second": rows_per_second(rows_loaded, time.time() - start_time)
+    }
 
 
 # -------------------------------------------------
@@ -155,20 +485,155 @@ def truncate_production_tables(connection):
         CASCADE
     """))
 
-def enforce_product_quality(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
 
-    df["product_name"] = df["product_name"].fillna("Unknown Product")
-    df["category"] = df["category"].fillna("Unknown")
-    df["sub_category"] = df["sub_category"].fillna("Unknown")
-    df["brand"] = df["brand"].fillna("Unknown Brand")
+def reset_load_target(connection, target: str):
+    # A freshly created shadow schema is already empty
+    if target == "production":
+        truncate_production_tables(connection)
+
 
-    df = df[df["price"] > 0]
-    df = df[df["cost"] >= 0]
+def enforce_product_quality(df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+    if copy:
+        df = df.copy()
 
+    df["product_name"] = fill_missing(df["product_name"], "Unknown Product")
+    df["category"] = fill_missing(df["category"], "Unknown")
+    df["sub_category"] = fill_missing(df["sub_category"], "Unknown")
+    df["brand"] = fill_missing(df["brand"], "Unknown Brand")
+
+    # Price/cost filters are business_rules.products in config.yaml
     return df
 
 
+# -------------------------------------------------
+# STREAMING (SERVER-SIDE CURSOR) TRANSFORM
+# -------------------------------------------------
+def stream_to_production(table_name: str, connection, schema: str = "production") -> dict:
+    # stream_results makes psycopg2 use a named server-side cursor, so only
+    # one chunk is fetched into memory at a time. Each chunk is written out
+    # before the next one is read. The option is set on the statement, not
+    # the connection, so the inserts keep using a regular cursor.
+    query = text(STAGING_QUERIES[table_name]).execution_options(
+        stream_results=True, max_row_buffer=CHUNK_SIZE
+    )
+    start_time = time.time()
+    rows_loaded = 0
+    chunks_loaded = 0
+
+    for chunk in schema_registry.read_sql(query, connection, table_name, chunksize=CHUNK_SIZE):
+        chunk = transform_table(chunk, table_name, copy=False)
+        rows_loaded += load_to_production(chunk, table_name, connection, schema)["rows_loaded"]
+        chunks_loaded += 1
+
+    return {
+        "rows_loaded": rows_loaded,
+        "chunks_loaded": chunks_loaded,
+        "rows_per_second": rows_per_second(rows_loaded, time.time() - start_time)
+    }
+
+
+# -------------------------------------------------
+# INCREMENTAL MERGE (UPSERT BY staging.loaded_at)
+# -------------------------------------------------
+def ensure_load_state(connection):
+    # Same definition as the production DDL, for databases created before it
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS production.load_state (
+            table_name VARCHAR(50) PRIMARY KEY,
+            watermark TIMESTAMP,
+            rows_upserted BIGINT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def get_load_state(connection) -> dict:
+    rows = connection.execute(text(
+        "SELECT table_name, watermark FROM production.load_state"
+    ))
+    return {row.table_name: row.watermark for row in rows}
+
+
+def save_load_state(connection, table_name: str, watermark, rows_upserted: int,
+                    schema: str = "production"):
+    connection.execute(text(f"""
+        INSERT INTO {schema}.load_state (table_name, watermark, rows_upserted, updated_at)
+        VALUES (:table_name, :watermark, :rows_upserted, CURRENT_TIMESTAMP)
+        ON CONFLICT (table_name) DO UPDATE SET
+            watermark = EXCLUDED.watermark,
+            rows_upserted = EXCLUDED.rows_upserted,
+            updated_at = EXCLUDED.updated_at
+    """), {"table_name": table_name, "watermark": watermark, "rows_upserted": rows_upserted})
+
+
+def staging_high_water(connection, table_name: str):
+    return connection.execute(text(
+        f"SELECT MAX(loaded_at) FROM staging.{table_name}"
+    )).scalar()
+
+
+def read_staging_delta(table_name: str, connection, low, high) -> pd.DataFrame:
+    # Ingestion only bumps loaded_at on rows whose values changed, so the
+    # (low, high] window is exactly the new and changed rows since last run.
+    query = STAGING_QUERIES[table_name] + " WHERE loaded_at <= :high"
+    params = {"high": high}
+    if low is not None:
+        query += " AND loaded_at > :low"
+        params["low"] = low
+    return schema_registry.read_sql(text(query), connection, table_name, params=params)
+
+
+def merge_to_production(df: pd.DataFrame, table_name: str, connection) -> dict:
+    start_time = time.time()
+    columns = PRODUCTION_COLUMNS[table_name]
+    key = PRIMARY_KEYS[table_name]
+    delta = f"delta_{table_name}"
+
+    connection.execute(text(
+        f"CREATE TEMP TABLE {delta} (LIKE production.{table_name} INCLUDING DEFAULTS) "
+        f"ON COMMIT DROP"
+    ))
+    copy_to_production(df[columns], delta, connection, schema="pg_temp")
+
+    # Rows whose values are unchanged are left alone (no new tuple, no
+    # updated_at bump).
+    non_key = [c for c in columns if c != key]
+    result = connection.execute(text(f"""
+        INSERT INTO production.{table_name} ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM {delta}
+        ON CONFLICT ({key}) DO UPDATE SET
+            {', '.join(f"{c} = EXCLUDED.{c}" for c in non_key)},
+            updated_at = CURRENT_TIMESTAMP
+        WHERE ({', '.join(f"production.{table_name}.{c}" for c in non_key)})
+            IS DISTINCT FROM ({', '.join(f"EXCLUDED.{c}" for c in non_key)})
+    """))
+    connection.execute(text(f"DROP TABLE {delta}"))
+
+    return {
+        "rows_read": len(df),
+        "rows_upserted": result.rowcount,
+        "rows_per_second": rows_per_second(len(df), time.time() - start_time)
+    }
+
+
+def load_incremental(connection) -> dict:
+    state = get_load_state(connection)
+    results = {}
+
+    for table in TABLE_ORDER:
+        high = staging_high_water(connection, table)
+        if high is None or (state.get(table) is not None and high <= state[table]):
+            results[table] = {"rows_read": 0, "rows_upserted": 0, "status": "unchanged"}
+            continue
+
+        df = read_staging_delta(table, connection, state.get(table), high)
+        df = transform_table(df, table, copy=False)
+        results[table] = merge_to_production(df, table, connection)
+        save_load_state(connection, table, high, results[table]["rows_upserted"])
+
+    return results
+
+
 # -------------------------------------------------
 # MAIN
 # -------------------------------------------------
@@ -176,6 +641,8 @@ if __name__ == "__main__":
 
     summary = {
         "transformation_timestamp": datetime.now().isoformat(),
+        "mode": TRANSFORM_MODE,
+        "load_strategy": LOAD_STRATEGY,
         "records_processed": {},
         "transformations_applied": [
             "text_normalization",
@@ -188,50 +655,84 @@ if __name__ == "__main__":
         ]
     }
 
-    with engine.begin() as conn:
+    # Full loads either truncate production in place or, with
+    # pipeline.shadow_swap, build production_next and swap it in at the end
+    use_shadow = SHADOW_SWAP and LOAD_STRATEGY != "incremental"
+    target = shadow_name("production") if use_shadow else "production"
+    summary["load_target"] = target
 
-        # READ FROM STAGING (NO loaded_at SELECTED)
-        customers_df = pd.read_sql("""
-            SELECT customer_id, first_name, last_name, email, phone,
-                   registration_date, city, state, country, age_group
-            FROM staging.customers
-        """, conn)
-
-        products_df = pd.read_sql("""
-            SELECT product_id, product_name, category, sub_category,
-                   price, cost, brand, stock_quantity, supplier_id
-            FROM staging.products
-        """, conn)
-
-        transactions_df = pd.read_sql("""
-            SELECT transaction_id, customer_id, transaction_date,
-                   transaction_time, payment_method, shipping_address,
-                   total_amount
-            FROM staging.transactions
-        """, conn)
-
-        items_df = pd.read_sql("""
-            SELECT item_id, transaction_id, product_id,
-                   quantity, unit_price, discount_percentage, line_total
-            FROM staging.transaction_items
-        """, conn)
-
-        # TRANSFORM
-        customers_df = cleanse_customer_data(customers_df)
-        products_df = cleanse_product_data(products_df)
-        products_df = enforce_product_quality(products_df)
-        transactions_df = apply_business_rules(transactions_df, "transactions")
-        items_df = apply_business_rules(items_df, "transaction_items")
-        
-
-
-        # TRUNCATE + LOAD
-        truncate_production_tables(conn)
-
-        summary["records_processed"]["customers"] = load_to_production(customers_df, "customers", conn)
-        summary["records_processed"]["products"] = load_to_production(products_df, "products", conn)
-        summary["records_processed"]["transactions"] = load_to_production(transactions_df, "transactions", conn)
-        summary["records_processed"]["transaction_items"] = load_to_production(items_df, "transaction_items", conn)
+    with engine.begin() as conn:
+        ensure_load_state(conn)
+
+        if use_shadow:
+            deferred_ddl = create_shadow_schema(conn, "production")
+
+        # In-place full loads can drop secondary indexes and foreign keys
+        # and rebuild them once the data is in (pipeline.deferred_indexes)
+        defer = DEFERRED_INDEXES and LOAD_STRATEGY != "incremental" and not use_shadow
+        index_context = (
+            deferred_indexes(conn, "production", **INDEX_BUILD_OPTIONS) if defer else nullcontext()
+        )
+
+        with index_context:
+            if LOAD_STRATEGY == "incremental":
+                # Only new/changed staging rows are read, cleansed and upserted
+                summary["records_processed"] = load_incremental(conn)
+
+            elif TRANSFORM_MODE == "pushdown":
+                # No rows leave the database
+                reset_load_target(conn, target)
+                for table in TABLE_ORDER:
+                    summary["records_processed"][table] = load_pushdown(table, conn, target)
+
+            elif TRANSFORM_MODE == "streaming":
+                reset_load_target(conn, target)
+                for table in TABLE_ORDER:
+                    summary["records_processed"][table] = stream_to_production(table, conn, target)
+
+            else:
+                # READ FROM STAGING
+                frames = {
+                    table: schema_registry.read_sql(STAGING_QUERIES[table], conn, table)
+                    for table in TABLE_ORDER
+                }
+
+                # TRANSFORM
+                frames = {
+                    table: transform_table(df, table, copy=False)
+                    for table, df in frames.items()
+                }
+
+                # TRUNCATE + LOAD
+                reset_load_target(conn, target)
+
+                for table in TABLE_ORDER:
+                    summary["records_processed"][table] = load_to_production(
+                        frames[table], table, conn, target
+                    )
+
+        if use_shadow:
+            # Keys and indexes are built once over the loaded data
+            build_indexes(conn, deferred_ddl, **INDEX_BUILD_OPTIONS)
+
+        if LOAD_STRATEGY != "incremental":
+            # A full reload covers everything staged so far
+            for table in TABLE_ORDER:
+                save_load_state(
+                    conn, table, staging_high_water(conn, table),
+                    summary["records_processed"][table]["rows_loaded"], target
+                )
+
+        if use_shadow:
+            swap_schema(conn, "production")
+
+    if use_shadow:
+        with engine.begin() as conn:
+            drop_retired_schema(conn, "production")
+
+    summary["business_rules"] = RULE_STATS
+    if RULE_SCAN_SECONDS:
+        summary["business_rule_scan_seconds"] = RULE_SCAN_SECONDS
 
     with open(os.path.join(OUTPUT_PATH, "transformation_summary.json"), "w") as f:
         json.dump(summary, f, indent=4)
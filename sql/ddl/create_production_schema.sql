@@ -81,3 +81,19 @@ CREATE INDEX IF NOT EXISTS idx_items_transaction
 
 CREATE INDEX IF NOT EXISTS idx_items_product
     ON production.transaction_items(product_id);
+
+-- Incremental warehouse loads look up rows changed since their last run
+CREATE INDEX IF NOT EXISTS idx_transactions_updated_at
+    ON production.transactions(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_items_updated_at
+    ON production.transaction_items(updated_at);
+
+
+-- Staging loaded_at high-water marks for incremental production loads
+CREATE TABLE IF NOT EXISTS production.load_state (
+    table_name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP,
+    rows_upserted BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -54,3 +54,12 @@ CREATE TABLE IF NOT EXISTS staging.transaction_items (
     line_total DECIMAL(12,2),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+
+-- High-water marks for incremental ingestion
+CREATE TABLE IF NOT EXISTS staging.ingestion_state (
+    table_name VARCHAR(50) PRIMARY KEY,
+    watermark VARCHAR(50),
+    rows_loaded BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
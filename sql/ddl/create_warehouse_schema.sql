@@ -16,9 +16,17 @@ CREATE TABLE IF NOT EXISTS warehouse.dim_customers (
     registration_date DATE,
     effective_date DATE,
     end_date DATE,
-    is_current BOOLEAN
+    is_current BOOLEAN,
+    attribute_hash CHAR(32)
 );
 
+-- Added on databases created before versions were hash-diffed; the next
+-- load fills it in
+ALTER TABLE warehouse.dim_customers ADD COLUMN IF NOT EXISTS attribute_hash CHAR(32);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_customers_current
+    ON warehouse.dim_customers (customer_id) WHERE is_current;
+
 -- ============================
 -- DIM PRODUCT (SCD TYPE 2)
 -- ============================
@@ -32,9 +40,15 @@ CREATE TABLE IF NOT EXISTS warehouse.dim_products (
     price_range VARCHAR,
     effective_date DATE,
     end_date DATE,
-    is_current BOOLEAN
+    is_current BOOLEAN,
+    attribute_hash CHAR(32)
 );
 
+ALTER TABLE warehouse.dim_products ADD COLUMN IF NOT EXISTS attribute_hash CHAR(32);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_products_current
+    ON warehouse.dim_products (product_id) WHERE is_current;
+
 -- ============================
 -- DIM DATE
 -- ============================
@@ -62,10 +76,30 @@ CREATE TABLE IF NOT EXISTS warehouse.dim_payment_method (
 );
 
 -- ============================
--- FACT SALES
+-- FACT SALES (MONTHLY RANGE PARTITIONS ON date_key)
 -- ============================
+-- Partitions are named fact_sales_pYYYYMM and created by the warehouse
+-- loader for the months in dim_date; retention detaches or drops them.
+
+-- Databases created before partitioning have a plain fact_sales. It is set
+-- aside here, with its key names, and copied into the partitioned table below
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'warehouse' AND c.relname = 'fact_sales' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE warehouse.fact_sales RENAME TO fact_sales_unpartitioned;
+        ALTER TABLE warehouse.fact_sales_unpartitioned
+            RENAME CONSTRAINT fact_sales_pkey TO fact_sales_unpartitioned_pkey;
+        ALTER SEQUENCE warehouse.fact_sales_sales_key_seq
+            RENAME TO fact_sales_unpartitioned_sales_key_seq;
+        DROP INDEX IF EXISTS warehouse.idx_fact_sales_transaction;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS warehouse.fact_sales (
-    sales_key BIGSERIAL PRIMARY KEY,
+    sales_key BIGSERIAL,
     date_key INTEGER REFERENCES warehouse.dim_date(date_key),
     customer_key INTEGER REFERENCES warehouse.dim_customers(customer_key),
     product_key INTEGER REFERENCES warehouse.dim_products(product_key),
@@ -76,8 +110,53 @@ CREATE TABLE IF NOT EXISTS warehouse.fact_sales (
     discount_amount NUMERIC(10,2),
     line_total NUMERIC(10,2),
     profit NUMERIC(10,2),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sales_key, date_key)
+) PARTITION BY RANGE (date_key);
+
+-- Finds the days a changed transaction was previously loaded under
+CREATE INDEX IF NOT EXISTS idx_fact_sales_transaction
+    ON warehouse.fact_sales (transaction_id);
+
+DO $$
+DECLARE
+    month DATE;
+BEGIN
+    IF to_regclass('warehouse.fact_sales_unpartitioned') IS NOT NULL THEN
+        FOR month IN
+            SELECT DISTINCT date_trunc('month', to_date(date_key::TEXT, 'YYYYMMDD'))::DATE
+            FROM warehouse.fact_sales_unpartitioned
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS warehouse.fact_sales_p%s '
+                'PARTITION OF warehouse.fact_sales FOR VALUES FROM (%s) TO (%s)',
+                to_char(month, 'YYYYMM'),
+                to_char(month, 'YYYYMMDD'),
+                to_char(month + INTERVAL '1 month', 'YYYYMMDD')
+            );
+        END LOOP;
+
+        INSERT INTO warehouse.fact_sales (
+            sales_key, date_key, customer_key, product_key, payment_method_key,
+            transaction_id, quantity, unit_price, discount_amount, line_total,
+            profit, created_at
+        )
+        SELECT
+            sales_key, date_key, customer_key, product_key, payment_method_key,
+            transaction_id, quantity, unit_price, discount_amount, line_total,
+            profit, created_at
+        FROM warehouse.fact_sales_unpartitioned;
+
+        PERFORM setval(
+            pg_get_serial_sequence('warehouse.fact_sales', 'sales_key'),
+            COALESCE(MAX(sales_key), 0) + 1,
+            false
+        )
+        FROM warehouse.fact_sales_unpartitioned;
+
+        DROP TABLE warehouse.fact_sales_unpartitioned;
+    END IF;
+END $$;
 
 -- ============================
 -- AGGREGATE TABLES
@@ -95,7 +174,11 @@ CREATE TABLE IF NOT EXISTS warehouse.agg_product_performance (
     total_quantity_sold INTEGER,
     total_revenue NUMERIC,
     total_profit NUMERIC,
-    avg_discount_percentage NUMERIC
+    avg_discount_percentage NUMERIC,
+    -- running sums behind the averages, so deltas can be merged in
+    sales_line_count BIGINT,
+    total_unit_price NUMERIC,
+    total_discount_percentage NUMERIC
 );
 
 CREATE TABLE IF NOT EXISTS warehouse.agg_customer_metrics (
@@ -103,5 +186,26 @@ CREATE TABLE IF NOT EXISTS warehouse.agg_customer_metrics (
     total_transactions INTEGER,
     total_spent NUMERIC,
     avg_order_value NUMERIC,
-    last_purchase_date DATE
+    last_purchase_date DATE,
+    sales_line_count BIGINT
+);
+
+-- Running sums on databases created before they existed; an incremental
+-- load rebuilds the aggregates once while any of them are still NULL
+ALTER TABLE warehouse.agg_product_performance
+    ADD COLUMN IF NOT EXISTS sales_line_count BIGINT,
+    ADD COLUMN IF NOT EXISTS total_unit_price NUMERIC,
+    ADD COLUMN IF NOT EXISTS total_discount_percentage NUMERIC;
+
+ALTER TABLE warehouse.agg_customer_metrics
+    ADD COLUMN IF NOT EXISTS sales_line_count BIGINT;
+
+-- ============================
+-- LOAD STATE (INCREMENTAL FACT LOADS)
+-- ============================
+CREATE TABLE IF NOT EXISTS warehouse.load_state (
+    table_name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP,
+    rows_loaded BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
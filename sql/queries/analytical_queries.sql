@@ -1,8 +1,13 @@
+-- Each query is written against warehouse.fact_sales. "needs:" lists the
+-- grain | measures it uses; "-- Qn @ <table>" blocks are equivalent versions
+-- over an aggregate, which generate_analytics.py runs instead when that
+-- aggregate covers the needs (see AGGREGATE_COVERAGE there).
+
 -- =========================================================
 -- Q1: Top 10 Products by Revenue
 -- Objective: Identify best-selling products by revenue
 -- =========================================================
--- Q1
+-- Q1 needs: product | revenue, quantity, unit_price
 SELECT
     dp.product_name,
     dp.category,
@@ -16,11 +21,25 @@ GROUP BY dp.product_name, dp.category
 ORDER BY total_revenue DESC
 LIMIT 10;
 
+-- Q1 @ agg_product_performance
+SELECT
+    dp.product_name,
+    dp.category,
+    SUM(app.total_revenue) AS total_revenue,
+    SUM(app.total_quantity_sold) AS units_sold,
+    ROUND(SUM(app.total_unit_price) / SUM(app.sales_line_count), 2) AS avg_price
+FROM warehouse.agg_product_performance app
+JOIN warehouse.dim_products dp
+    ON app.product_key = dp.product_key
+GROUP BY dp.product_name, dp.category
+ORDER BY total_revenue DESC
+LIMIT 10;
+
 -- =========================================================
 -- Q2: Monthly Sales Trend
 -- Objective: Analyze revenue and transactions over time
 -- =========================================================
--- Q2
+-- Q2 needs: date | revenue, transactions, customers
 SELECT
     CONCAT(dd.year, '-', LPAD(dd.month::TEXT, 2, '0')) AS year_month,
     SUM(fs.line_total) AS total_revenue,
@@ -40,7 +59,7 @@ ORDER BY year_month;
 -- Q3: Customer Segmentation Analysis
 -- Objective: Segment customers based on spending
 -- =========================================================
--- Q3
+-- Q3 needs: customer | revenue
 WITH customer_spend AS (
     SELECT
         customer_key,
@@ -61,11 +80,31 @@ SELECT
 FROM customer_spend
 GROUP BY spending_segment;
 
+-- Q3 @ agg_customer_metrics
+WITH customer_spend AS (
+    SELECT
+        customer_key,
+        total_spent
+    FROM warehouse.agg_customer_metrics
+)
+SELECT
+    CASE
+        WHEN total_spent < 1000 THEN '$0-$1,000'
+        WHEN total_spent < 5000 THEN '$1,000-$5,000'
+        WHEN total_spent < 10000 THEN '$5,000-$10,000'
+        ELSE '$10,000+'
+    END AS spending_segment,
+    COUNT(*) AS customer_count,
+    SUM(total_spent) AS total_revenue,
+    ROUND(AVG(total_spent), 2) AS avg_transaction_value
+FROM customer_spend
+GROUP BY spending_segment;
+
 -- =========================================================
 -- Q4: Category Performance
 -- Objective: Compare revenue and profit by category
 -- =========================================================
--- Q4
+-- Q4 needs: product | revenue, profit, quantity
 SELECT
     dp.category,
     SUM(fs.line_total) AS total_revenue,
@@ -77,11 +116,23 @@ JOIN warehouse.dim_products dp
     ON fs.product_key = dp.product_key
 GROUP BY dp.category;
 
+-- Q4 @ agg_product_performance
+SELECT
+    dp.category,
+    SUM(app.total_revenue) AS total_revenue,
+    SUM(app.total_profit) AS total_profit,
+    ROUND(SUM(app.total_profit) / NULLIF(SUM(app.total_revenue), 0) * 100, 2) AS profit_margin_pct,
+    SUM(app.total_quantity_sold) AS units_sold
+FROM warehouse.agg_product_performance app
+JOIN warehouse.dim_products dp
+    ON app.product_key = dp.product_key
+GROUP BY dp.category;
+
 -- =========================================================
 -- Q5: Payment Method Distribution
 -- Objective: Analyze payment preferences
 -- =========================================================
--- Q5
+-- Q5 needs: payment_method | revenue, transactions
 SELECT
     dpm.payment_method_name AS payment_method,
     COUNT(DISTINCT fs.transaction_id) AS transaction_count,
@@ -103,7 +154,7 @@ GROUP BY dpm.payment_method_name;
 -- Q6: Geographic Analysis
 -- Objective: Identify high-revenue states
 -- =========================================================
--- Q6
+-- Q6 needs: customer | revenue, customers
 SELECT
     dc.state,
     SUM(fs.line_total) AS total_revenue,
@@ -115,11 +166,23 @@ JOIN warehouse.dim_customers dc
     ON fs.customer_key = dc.customer_key
 GROUP BY dc.state;
 
+-- Q6 @ agg_customer_metrics
+SELECT
+    dc.state,
+    SUM(acm.total_spent) AS total_revenue,
+    COUNT(DISTINCT dc.customer_key) AS total_customers,
+    ROUND(SUM(acm.total_spent) / NULLIF(COUNT(DISTINCT dc.customer_key), 0), 2)
+        AS avg_revenue_per_customer
+FROM warehouse.agg_customer_metrics acm
+JOIN warehouse.dim_customers dc
+    ON acm.customer_key = dc.customer_key
+GROUP BY dc.state;
+
 -- =========================================================
 -- Q7: Customer Lifetime Value (CLV)
 -- Objective: Measure long-term customer value
 -- =========================================================
--- Q7
+-- Q7 needs: customer | revenue, transactions, lines
 SELECT
     dc.customer_id,
     dc.full_name,
@@ -132,11 +195,24 @@ JOIN warehouse.dim_customers dc
     ON fs.customer_key = dc.customer_key
 GROUP BY dc.customer_id, dc.full_name, dc.registration_date;
 
+-- Q7 @ agg_customer_metrics
+SELECT
+    dc.customer_id,
+    dc.full_name,
+    SUM(acm.total_spent) AS total_spent,
+    SUM(acm.total_transactions) AS transaction_count,
+    CURRENT_DATE - dc.registration_date AS days_since_registration,
+    ROUND(SUM(acm.total_spent) / SUM(acm.sales_line_count), 2) AS avg_order_value
+FROM warehouse.agg_customer_metrics acm
+JOIN warehouse.dim_customers dc
+    ON acm.customer_key = dc.customer_key
+GROUP BY dc.customer_id, dc.full_name, dc.registration_date;
+
 -- =========================================================
 -- Q8: Product Profitability Analysis
 -- Objective: Identify most profitable products
 -- =========================================================
--- Q8
+-- Q8 needs: product | revenue, profit, quantity
 SELECT
     dp.product_name,
     dp.category,
@@ -151,11 +227,26 @@ JOIN warehouse.dim_products dp
 GROUP BY dp.product_name, dp.category
 ORDER BY total_profit DESC;
 
+-- Q8 @ agg_product_performance
+SELECT
+    dp.product_name,
+    dp.category,
+    SUM(app.total_profit) AS total_profit,
+    ROUND(SUM(app.total_profit) / NULLIF(SUM(app.total_revenue), 0) * 100, 2)
+        AS profit_margin,
+    SUM(app.total_revenue) AS revenue,
+    SUM(app.total_quantity_sold) AS units_sold
+FROM warehouse.agg_product_performance app
+JOIN warehouse.dim_products dp
+    ON app.product_key = dp.product_key
+GROUP BY dp.product_name, dp.category
+ORDER BY total_profit DESC;
+
 -- =========================================================
 -- Q9: Day of Week Sales Pattern
 -- Objective: Identify daily sales trends
 -- =========================================================
--- Q9
+-- Q9 needs: date | revenue, transactions
 SELECT
     day_name,
     ROUND(AVG(daily_revenue), 2) AS avg_daily_revenue,
@@ -174,11 +265,22 @@ FROM (
 ) sub
 GROUP BY day_name;
 
+-- Q9 @ agg_daily_sales
+SELECT
+    dd.day_name,
+    ROUND(AVG(ads.total_revenue), 2) AS avg_daily_revenue,
+    ROUND(AVG(ads.total_transactions), 2) AS avg_daily_transactions,
+    SUM(ads.total_revenue) AS total_revenue
+FROM warehouse.agg_daily_sales ads
+JOIN warehouse.dim_date dd
+    ON ads.date_key = dd.date_key
+GROUP BY dd.day_name;
+
 -- =========================================================
 -- Q10: Discount Impact Analysis
 -- Objective: Measure effectiveness of discounts
 -- =========================================================
--- Q10
+-- Q10 needs: line | revenue, quantity, discount
 SELECT
     CASE
         WHEN discount_pct = 0 THEN '0%'
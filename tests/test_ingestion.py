@@ -18,3 +18,234 @@ def test_staging_tables_exist(engine):
     }
 
     assert expected_tables.issubset(tables)
+
+
+TRANSACTIONS_FIXTURE = (
+    "transaction_id,customer_id,transaction_date,transaction_time,"
+    "payment_method,shipping_address,total_amount\n"
+    'TXN90001,CUST0001,2023-03-01,09:15:00,UPI,"12 Main St, Apt 4, Pune",1499.50\n'
+    'TXN90002,CUST0002,2023-03-02,23:59:59,Cash on Delivery,"The ""Old"" Mill, Goa",0.01\n'
+    "TXN90003,CUST0003,2023-03-03,00:00:00,Net Banking,,250.00\n"
+    "TXN90004,None,2023-03-04,12:00:00,NA,Cafe Road,99.99\n"
+)
+
+
+def staging_module(monkeypatch, **overrides):
+    import sys
+
+    sys.path.insert(0, "scripts/ingestion")
+    import ingest_to_staging
+
+    for name, value in overrides.items():
+        monkeypatch.setattr(ingest_to_staging, name, value)
+    return ingest_to_staging
+
+
+def read_back(conn, table):
+    import pandas as pd
+
+    return pd.read_sql(text(
+        "SELECT transaction_id, customer_id, CAST(transaction_date AS TEXT) AS transaction_date,"
+        " CAST(transaction_time AS TEXT) AS transaction_time, payment_method,"
+        " shipping_address, CAST(total_amount AS TEXT) AS total_amount"
+        f" FROM staging.{table} ORDER BY transaction_id"
+    ), conn)
+
+
+def expected_fixture():
+    import io
+    import pandas as pd
+
+    # Only empty fields are NULL, as with COPY
+    return pd.read_csv(
+        io.StringIO(TRANSACTIONS_FIXTURE), dtype=str, keep_default_na=False, na_values=[""]
+    )
+
+
+def test_copy_load_round_trips_csv(engine, monkeypatch, tmp_path):
+    ingest = staging_module(monkeypatch, LOAD_METHOD="copy")
+    raw_file = tmp_path / "transactions.csv"
+    raw_file.write_text(TRANSACTIONS_FIXTURE)
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text(
+                "CREATE TABLE staging.copy_test (LIKE staging.transactions INCLUDING DEFAULTS)"
+            ))
+            result = ingest.load_csv_to_staging(
+                str(raw_file), "transactions", conn, target="copy_test"
+            )
+
+            assert result["rows_loaded"] == 4
+            loaded = read_back(conn, "copy_test")
+            assert loaded.fillna("<null>").equals(expected_fixture().fillna("<null>"))
+        finally:
+            trans.rollback()
+
+
+def test_streaming_load_round_trips_csv_in_chunks(engine, monkeypatch, tmp_path):
+    ingest = staging_module(monkeypatch, LOAD_METHOD="copy", BATCH_SIZE=3)
+    raw_file = tmp_path / "transactions.csv"
+    raw_file.write_text(TRANSACTIONS_FIXTURE)
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text(
+                "CREATE TABLE staging.stream_test (LIKE staging.transactions INCLUDING DEFAULTS)"
+            ))
+            result = ingest.stream_to_staging(
+                str(raw_file), "transactions", conn, target="stream_test"
+            )
+
+            assert result["rows_loaded"] == 4
+            assert result["chunks_loaded"] == 2
+            loaded = read_back(conn, "stream_test")
+            assert loaded.fillna("<null>").equals(expected_fixture().fillna("<null>"))
+        finally:
+            trans.rollback()
+
+
+def test_parallel_load_swaps_in_every_shadow_table(engine, monkeypatch, tmp_path):
+    import pandas as pd
+
+    tables = ["parallel_test_a", "parallel_test_b"]
+    ingest = staging_module(
+        monkeypatch, TABLE_ORDER=tables, RAW_DATA_PATH=str(tmp_path), RAW_FORMAT="csv",
+        LOAD_METHOD="copy", STREAMING_INGESTION=False
+    )
+    header, *rows = TRANSACTIONS_FIXTURE.splitlines(keepends=True)
+    (tmp_path / "parallel_test_a.csv").write_text(header + "".join(rows[:2]))
+    (tmp_path / "parallel_test_b.csv").write_text(header + "".join(rows[2:]))
+
+    try:
+        with engine.begin() as conn:
+            for table in tables:
+                conn.execute(text(
+                    f"CREATE TABLE staging.{table} (LIKE staging.transactions INCLUDING ALL)"
+                ))
+                # Stale contents must not survive the swap
+                conn.execute(text(
+                    f"INSERT INTO staging.{table} (transaction_id) VALUES ('TXN00000')"
+                ))
+
+        results = ingest.ingest_parallel(engine, workers=2)
+
+        assert [results[f"staging.{t}"]["rows_loaded"] for t in tables] == [2, 2]
+        with engine.connect() as conn:
+            loaded = pd.concat([read_back(conn, t) for t in tables], ignore_index=True)
+            assert loaded.fillna("<null>").equals(expected_fixture().fillna("<null>"))
+
+            leftovers = conn.execute(text("""
+                SELECT tablename FROM pg_tables
+                WHERE schemaname = 'staging' AND tablename LIKE 'parallel_test_%_next'
+            """)).scalars().all()
+            assert leftovers == []
+            index_names = conn.execute(text("""
+                SELECT indexname FROM pg_indexes
+                WHERE schemaname = 'staging' AND tablename LIKE 'parallel_test_%'
+                ORDER BY indexname
+            """)).scalars().all()
+            assert index_names == [f"{t}_pkey" for t in tables]
+    finally:
+        with engine.begin() as conn:
+            for table in tables:
+                conn.execute(text(f"DROP TABLE IF EXISTS staging.{table}"))
+                conn.execute(text(f"DROP TABLE IF EXISTS staging.{table}_next"))
+
+
+CUSTOMERS_HEADER = (
+    "customer_id,first_name,last_name,email,phone,registration_date,"
+    "city,state,country,age_group\n"
+)
+
+
+def test_incremental_upsert_keeps_customers_dated_before_watermark(engine, monkeypatch, tmp_path):
+    ingest = staging_module(monkeypatch)
+    raw_file = tmp_path / "customers.csv"
+    raw_file.write_text(
+        CUSTOMERS_HEADER
+        # Edited: same registration date, new city
+        + "CUSTT0001,Asha,Rao,asha@example.com,555-0101,2023-06-01,Goa,Goa,India,26-35\n"
+        # New, but registered before the watermark
+        + "CUSTT0002,Ravi,Iyer,ravi@example.com,555-0102,2022-01-15,Pune,Maharashtra,India,36-45\n"
+        # New, after the watermark
+        + "CUSTT0003,Meera,Das,meera@example.com,555-0103,2024-02-01,Delhi,Delhi,India,18-25\n"
+    )
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("""
+                INSERT INTO staging.customers (
+                    customer_id, first_name, last_name, email, phone,
+                    registration_date, city, state, country, age_group
+                )
+                VALUES ('CUSTT0001', 'Asha', 'Rao', 'asha@example.com', '555-0101',
+                        '2023-06-01', 'Mumbai', 'Maharashtra', 'India', '26-35')
+            """))
+            result = ingest.upsert_incremental(
+                str(raw_file), "customers", conn, watermark="2023-12-31"
+            )
+            rows = dict(conn.execute(text("""
+                SELECT customer_id, city FROM staging.customers
+                WHERE customer_id LIKE 'CUSTT%'
+            """)).fetchall())
+        finally:
+            trans.rollback()
+
+    assert result["rows_loaded"] == 3
+    assert rows == {"CUSTT0001": "Goa", "CUSTT0002": "Pune", "CUSTT0003": "Delhi"}
+
+
+def test_manifest_skips_file_only_after_late_rows_are_applied(engine, monkeypatch, tmp_path):
+    ingest = staging_module(
+        monkeypatch, TABLE_ORDER=["transactions"], RAW_DATA_PATH=str(tmp_path),
+        RAW_FORMAT="csv", MANIFEST_PATH=str(tmp_path / "manifest.json")
+    )
+    (tmp_path / "transactions.csv").write_text(TRANSACTIONS_FIXTURE)
+    fixture_ids = ["TXN90001", "TXN90002", "TXN90003", "TXN90004"]
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            # TXN90002 arrives late: dated before the watermark, never loaded
+            conn.execute(text("""
+                INSERT INTO staging.transactions (transaction_id, customer_id, transaction_date)
+                VALUES ('TXN90001', 'CUST0001', '2023-03-01'),
+                       ('TXN90003', 'CUST0003', '2023-03-03')
+            """))
+            ingest.save_watermark(conn, "transactions", "2023-03-03", 2)
+
+            first = ingest.ingest_incremental(conn, ingest.load_manifest())
+            loaded_ids = conn.execute(text(
+                "SELECT transaction_id FROM staging.transactions "
+                "WHERE transaction_id = ANY(:ids) ORDER BY transaction_id"
+            ), {"ids": fixture_ids}).scalars().all()
+            ingest.write_manifest(
+                ingest.load_manifest(), ingest.validate_staging_load(conn)
+            )
+            second = ingest.ingest_incremental(conn, ingest.load_manifest())
+        finally:
+            trans.rollback()
+
+    assert first["staging.transactions"]["status"] == "success"
+    assert loaded_ids == fixture_ids
+    assert second["staging.transactions"]["status"] == "skipped"
+
+
+def test_watermarks_work_without_ingestion_state_table(engine, monkeypatch):
+    ingest = staging_module(monkeypatch)
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("DROP TABLE staging.ingestion_state"))
+            ingest.ensure_ingestion_state(conn)
+            ingest.reset_watermarks(conn)
+            watermarks = ingest.get_watermarks(conn)
+        finally:
+            trans.rollback()
+
+    assert set(watermarks) == set(ingest.TABLE_ORDER)
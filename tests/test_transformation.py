@@ -11,3 +11,108 @@ def test_no_orphan_transactions(engine):
         """)).scalar()
 
     assert result == 0
+
+
+def test_pushdown_matches_pandas_transform(engine):
+    import sys
+    import pandas as pd
+
+    sys.path.insert(0, "scripts/transformation")
+    import staging_to_production as etl
+
+    with engine.connect() as conn:
+        for table in etl.TABLE_ORDER:
+            key = etl.PRODUCTION_COLUMNS[table][0]
+
+            expected = etl.transform_table(
+                etl.schema_registry.read_sql(text(etl.STAGING_QUERIES[table]), conn, table), table
+            )[etl.PRODUCTION_COLUMNS[table]]
+            actual = etl.schema_registry.apply_schema(
+                pd.read_sql(text(etl.PUSHDOWN_QUERIES[table]), conn), table
+            )
+
+            expected = expected.sort_values(key).reset_index(drop=True)
+            actual = actual.sort_values(key).reset_index(drop=True)
+
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_incremental_merge_skips_unchanged_rows(engine):
+    import sys
+    import pandas as pd
+
+    sys.path.insert(0, "scripts/transformation")
+    import staging_to_production as etl
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            current = pd.read_sql(
+                text("SELECT * FROM production.customers ORDER BY customer_id LIMIT 2"),
+                conn
+            )
+            assert etl.merge_to_production(current, "customers", conn)["rows_upserted"] == 0
+
+            current.loc[0, "city"] = "Changed City"
+            assert etl.merge_to_production(current, "customers", conn)["rows_upserted"] == 1
+        finally:
+            trans.rollback()
+
+
+def test_normalize_text_column_matches_str_methods():
+    import sys
+    import numpy as np
+    import pandas as pd
+
+    sys.path.insert(0, "scripts/transformation")
+    import staging_to_production as etl
+
+    names = pd.Series(
+        ["  ann", None, "BOB ", np.nan, "o'neil", "ann  ", "BOB "], index=list("abcdefg")
+    )
+
+    pd.testing.assert_series_equal(
+        etl.normalize_text_column(names, "title"), names.str.strip().str.title()
+    )
+    pd.testing.assert_series_equal(
+        etl.normalize_text_column(names, "lower"), names.str.strip().str.lower()
+    )
+
+
+def test_business_rules_single_mask_and_sql():
+    import sys
+    import numpy as np
+    import pandas as pd
+
+    sys.path.insert(0, "scripts/transformation")
+    import staging_to_production as etl
+
+    products = pd.DataFrame({
+        "product_id": ["P1", "P2", "P3", "P4"],
+        "price": [10.0, -1.0, 5.0, np.nan],
+        "cost": [2.0, 1.0, -3.0, 1.0],
+    })
+    etl.RULE_STATS.clear()
+
+    kept = etl.apply_business_rules(products, "products")
+
+    assert kept["product_id"].tolist() == ["P1"]
+    assert etl.RULE_STATS["products"]["positive_price"]["rows_rejected"] == 2
+    assert etl.RULE_STATS["products"]["non_negative_cost"]["rows_rejected"] == 1
+    assert etl.business_rule_where("products") == "WHERE price > 0\n          AND cost >= 0"
+
+
+def test_pushdown_rule_stats_time_the_scan_not_each_rule(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import staging_to_production as etl
+
+    etl.RULE_STATS.clear()
+    etl.RULE_SCAN_SECONDS.clear()
+    with engine.connect() as conn:
+        etl.pushdown_rule_stats("products", conn)
+
+    assert set(etl.RULE_SCAN_SECONDS) == {"products"}
+    assert set(etl.RULE_STATS["products"]) == {"positive_price", "non_negative_cost"}
+    assert all("seconds" not in stats for stats in etl.RULE_STATS["products"].values())
@@ -7,3 +7,301 @@ def test_fact_sales_loaded(engine):
         )).scalar()
 
     assert count > 0
+
+
+def test_shadow_schema_swap_keeps_keys_and_sequences(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import schema_management as sm
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("""
+                CREATE SCHEMA swap_test;
+                CREATE TABLE swap_test.dim (dim_key SERIAL PRIMARY KEY, name VARCHAR UNIQUE);
+                CREATE TABLE swap_test.fact (
+                    fact_key BIGSERIAL PRIMARY KEY,
+                    dim_key INTEGER REFERENCES swap_test.dim(dim_key)
+                );
+                CREATE INDEX idx_fact_dim ON swap_test.fact(dim_key);
+                INSERT INTO swap_test.dim (name) VALUES ('a'), ('b');
+            """))
+
+            ddl = sm.create_shadow_schema(conn, "swap_test")
+            conn.execute(text("INSERT INTO swap_test_next.dim (name) VALUES ('c')"))
+            sm.build_indexes(conn, ddl)
+            sm.swap_schema(conn, "swap_test")
+            sm.drop_retired_schema(conn, "swap_test")
+
+            # Surrogate keys continue from the live sequence
+            assert conn.execute(text("SELECT dim_key FROM swap_test.dim")).scalar() == 3
+            indexes = conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = 'swap_test'"
+            )).scalars().all()
+            assert {"dim_pkey", "dim_name_key", "fact_pkey", "idx_fact_dim"} <= set(indexes)
+            fk = conn.execute(text("""
+                SELECT confrelid::regclass::text FROM pg_constraint
+                WHERE conrelid = 'swap_test.fact'::regclass AND contype = 'f'
+            """)).scalar()
+            assert fk == "swap_test.dim"
+        finally:
+            trans.rollback()
+
+
+def test_deferred_indexes_are_rebuilt_after_load(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import schema_management as sm
+
+    def catalog(conn):
+        return conn.execute(text("""
+            SELECT indexname FROM pg_indexes WHERE schemaname = 'defer_test'
+            UNION ALL
+            SELECT conname || ':' || convalidated FROM pg_constraint
+            WHERE connamespace = 'defer_test'::regnamespace AND contype = 'f'
+        """)).scalars().all()
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("""
+                CREATE SCHEMA defer_test;
+                CREATE TABLE defer_test.dim (dim_key SERIAL PRIMARY KEY);
+                CREATE TABLE defer_test.fact (
+                    dim_key INTEGER CONSTRAINT fk_fact_dim REFERENCES defer_test.dim(dim_key)
+                );
+                CREATE INDEX idx_fact_dim ON defer_test.fact(dim_key);
+            """))
+            before = sorted(catalog(conn))
+
+            with sm.deferred_indexes(conn, "defer_test"):
+                assert catalog(conn) == ["dim_pkey"]
+                conn.execute(text("INSERT INTO defer_test.dim DEFAULT VALUES"))
+                conn.execute(text("INSERT INTO defer_test.fact VALUES (1)"))
+
+            assert sorted(catalog(conn)) == before
+            assert "fk_fact_dim:true" in before
+        finally:
+            trans.rollback()
+
+
+def test_incremental_fact_load_reloads_only_touched_days(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import load_warehouse as lw
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            lw.save_load_state(conn, "fact_sales", lw.production_high_water(conn), 0)
+            total = conn.execute(text("SELECT COUNT(*) FROM warehouse.fact_sales")).scalar()
+
+            # Move the earliest transaction forward one day
+            txn, old_key = conn.execute(text("""
+                UPDATE production.transactions
+                SET transaction_date = transaction_date + 1,
+                    updated_at = CURRENT_TIMESTAMP + INTERVAL '1 second'
+                WHERE transaction_id = (
+                    SELECT transaction_id FROM production.transactions
+                    ORDER BY transaction_date, transaction_id LIMIT 1
+                )
+                RETURNING transaction_id,
+                          CAST(TO_CHAR(transaction_date - 1, 'YYYYMMDD') AS INTEGER)
+            """)).one()
+
+            assert lw.touched_date_keys(conn, lw.get_load_state(conn)["fact_sales"],
+                                        lw.production_high_water(conn))[0] == old_key
+            lw.load_incremental(conn)
+
+            keys = conn.execute(text(
+                "SELECT DISTINCT date_key FROM warehouse.fact_sales WHERE transaction_id = :t"
+            ), {"t": txn}).scalars().all()
+            assert keys and old_key not in keys
+            assert conn.execute(text("SELECT COUNT(*) FROM warehouse.fact_sales")).scalar() == total
+            assert lw.touched_date_keys(conn, lw.get_load_state(conn)["fact_sales"],
+                                        lw.production_high_water(conn)) == []
+        finally:
+            trans.rollback()
+
+
+def test_fact_partitions_created_and_retired_by_month(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import load_warehouse as lw
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("""
+                CREATE SCHEMA part_test;
+                CREATE TABLE part_test.fact_sales (date_key INTEGER, line_total NUMERIC)
+                    PARTITION BY RANGE (date_key);
+                CREATE TABLE part_test.agg_daily_sales (date_key INTEGER PRIMARY KEY);
+            """))
+
+            # Months ending on or before the cutoff are never created
+            lw.ensure_fact_partitions(
+                conn, "part_test", "2023-01-15", "2023-04-02", cutoff=20230201
+            )
+            assert lw.list_fact_partitions(conn, "part_test") == [
+                ("fact_sales_p202302", 20230301),
+                ("fact_sales_p202303", 20230401),
+                ("fact_sales_p202304", 20230501),
+            ]
+
+            conn.execute(text("""
+                INSERT INTO part_test.fact_sales VALUES (20230210, 1), (20230305, 2), (20230401, 3);
+                INSERT INTO part_test.agg_daily_sales VALUES (20230210), (20230305), (20230401);
+            """))
+            lw.retire_fact_partitions(conn, 20230401, "drop", schema="part_test")
+
+            remaining = [name for name, _ in lw.list_fact_partitions(conn, "part_test")]
+            assert remaining == ["fact_sales_p202304"]
+            assert conn.execute(text(
+                "SELECT SUM(line_total) FROM part_test.fact_sales"
+            )).scalar() == 3
+            assert conn.execute(text(
+                "SELECT COUNT(*) FROM part_test.agg_daily_sales"
+            )).scalar() == 1
+        finally:
+            trans.rollback()
+
+
+def test_incremental_aggregates_match_full_rebuild(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import load_warehouse as lw
+
+    def aggregates(conn):
+        return [
+            conn.execute(text(f"SELECT * FROM warehouse.{table} ORDER BY 1")).fetchall()
+            for table in ("agg_product_performance", "agg_customer_metrics")
+        ]
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            lw.save_load_state(conn, "fact_sales", lw.production_high_water(conn), 0)
+            conn.execute(text("""
+                UPDATE production.transaction_items
+                SET quantity = quantity + 1,
+                    line_total = line_total + 10,
+                    updated_at = CURRENT_TIMESTAMP + INTERVAL '1 second'
+                WHERE item_id IN (
+                    SELECT item_id FROM production.transaction_items ORDER BY item_id LIMIT 3
+                )
+            """))
+            lw.load_incremental(conn)
+            merged = aggregates(conn)
+
+            lw.load_key_aggregates(conn)
+            assert aggregates(conn) == merged
+
+            # Aggregates from before the running-sum columns get rebuilt
+            conn.execute(text(
+                "UPDATE warehouse.agg_customer_metrics SET sales_line_count = NULL"
+            ))
+            lw.save_load_state(conn, "fact_sales", lw.production_high_water(conn), 0)
+            conn.execute(text("""
+                UPDATE production.transaction_items
+                SET updated_at = CURRENT_TIMESTAMP + INTERVAL '2 seconds'
+                WHERE item_id IN (
+                    SELECT item_id FROM production.transaction_items ORDER BY item_id LIMIT 1
+                )
+            """))
+            lw.load_incremental(conn)
+            assert aggregates(conn) == merged
+        finally:
+            trans.rollback()
+
+
+def test_query_router_prefers_covering_aggregate(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import generate_analytics as ga
+
+    queries = {q["number"]: q for q in ga.load_queries()}
+    with engine.connect() as conn:
+        assert ga.route_query(conn, queries[9])[1] == "agg_daily_sales"
+        # Distinct customers per month cannot be rolled up from daily rows
+        assert ga.route_query(conn, queries[2])[1] == "fact_sales"
+
+        # Variants over aggregates that do not cover the query are skipped
+        query = {
+            "sql": "SELECT 'fact'",
+            "grain": "customer",
+            "measures": {"revenue"},
+            "variants": {
+                "agg_customer_metrics": "SELECT 'customers'",
+                "agg_product_performance": "SELECT 'products'",
+            },
+        }
+        assert ga.route_query(conn, query) == ("SELECT 'customers'", "agg_customer_metrics")
+        query["measures"].add("customers_per_day")
+        assert ga.route_query(conn, query) == ("SELECT 'fact'", "fact_sales")
+
+
+def test_scd2_dimension_versions_only_changed_rows(engine):
+    import sys
+
+    sys.path.insert(0, "scripts/transformation")
+    import load_warehouse as lw
+
+    def current(conn):
+        return conn.execute(text(
+            "SELECT customer_key, customer_id FROM warehouse.dim_customers "
+            "WHERE is_current ORDER BY customer_id"
+        )).fetchall()
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            before = current(conn)
+            customer_id = before[0].customer_id
+            conn.execute(text(
+                "UPDATE production.customers SET city = city || ' (moved)' WHERE customer_id = :c"
+            ), {"c": customer_id})
+
+            assert lw.load_dim_customers(conn) == {"new": 0, "changed": 1}
+
+            # Every other customer keeps its surrogate key
+            after = current(conn)
+            assert after[1:] == before[1:]
+            assert after[0].customer_key != before[0].customer_key
+
+            closed = conn.execute(text(
+                "SELECT is_current, end_date FROM warehouse.dim_customers WHERE customer_key = :k"
+            ), {"k": before[0].customer_key}).one()
+            assert not closed.is_current and closed.end_date is not None
+
+            assert lw.load_dim_customers(conn) == {"new": 0, "changed": 0}
+
+            # Past sales keep the version valid on their date, whether their
+            # days are reloaded incrementally or in full
+            def fact_customer_keys():
+                return conn.execute(text("""
+                    SELECT DISTINCT fs.customer_key FROM warehouse.fact_sales fs
+                    JOIN warehouse.dim_customers dc ON dc.customer_key = fs.customer_key
+                    WHERE dc.customer_id = :c
+                """), {"c": customer_id}).scalars().all()
+
+            days = conn.execute(text("""
+                SELECT DISTINCT CAST(TO_CHAR(transaction_date, 'YYYYMMDD') AS INTEGER)
+                FROM production.transactions WHERE customer_id = :c
+            """), {"c": customer_id}).scalars().all()
+            lw.delete_days(conn, days)
+            lw.load_fact_sales(conn, date_keys=days)
+            assert fact_customer_keys() == [before[0].customer_key]
+
+            lw.delete_days(conn)
+            lw.load_fact_sales(conn)
+            assert fact_customer_keys() == [before[0].customer_key]
+        finally:
+            trans.rollback()